@@ -9,7 +9,7 @@ from .config import config
 from .agents import ConversationSession, PatientAgent, CounselorAgent
 from .dialogue_manager import DialogueManager, ConversationMode
 from .llm_client import get_llm_client
-from .prompts import PromptManager
+from .prompts import PromptManager, get_prompt_manager
 from .reasoning_engine import ReasoningEngine
 from .file_utils import get_file_manager, get_session_data_manager
 
@@ -27,6 +27,7 @@ __all__ = [
     "ConversationMode",
     "get_llm_client",
     "PromptManager",
+    "get_prompt_manager",
     "ReasoningEngine",
     "get_file_manager",
     "get_session_data_manager"
@@ -4,14 +4,14 @@ Encapsulates patient and counselor behavior and response generation.
 """
 
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
 from .config import config
 from .llm_client import get_llm_client
-from .prompts import PromptManager
+from .prompts import get_prompt_manager
 from .dialogue_manager import DialogueManager, ConversationMode
-from .reasoning_engine import ReasoningEngine, ReasoningResult, ModificationRecord
+from .reasoning_engine import get_reasoning_engine, ReasoningResult, ModificationRecord
 from .utils.sentence_rewriter import CounselorResponseEnhancer
 
 logger = logging.getLogger(__name__)
@@ -32,7 +32,7 @@ class BaseAgent(ABC):
     def __init__(self, agent_type: str):
         self.agent_type = agent_type
         self.llm_client = get_llm_client()
-        self.prompt_manager = PromptManager()
+        self.prompt_manager = get_prompt_manager()
         
     @abstractmethod
     def generate_response(self, 
@@ -104,7 +104,7 @@ class CounselorAgent(BaseAgent):
     def __init__(self, is_first_session: bool = True):
         super().__init__("counselor")
         self.is_first_session = is_first_session
-        self.reasoning_engine = ReasoningEngine()
+        self.reasoning_engine = get_reasoning_engine()
         self.modification_suggestion = ""
         self.response_enhancer = CounselorResponseEnhancer()
         
@@ -154,7 +154,7 @@ class CounselorAgent(BaseAgent):
                 reasoning_history.append(result)
                 
                 # Check if we should continue modification
-                if ("是" in result.conclusion) or revising_flag >= config.system.MAX_MODIFICATION_ATTEMPTS:
+                if result.conclusion == "是" or revising_flag >= config.system.MAX_MODIFICATION_ATTEMPTS:
                     # Response is acceptable or max attempts reached
                     # Enhance the response with sentence rewriter
                     dialogue_context = {
@@ -272,8 +272,9 @@ class ConversationSession:
     def __init__(self, 
                  patient_info: str,
                  is_first_session: bool = True,
-                 conversation_mode: str = ConversationMode.PATIENT_FIRST):
-        self.prompt_manager = PromptManager()
+                 conversation_mode: str = ConversationMode.PATIENT_FIRST,
+                 on_turn: Optional[Callable[[str, str], None]] = None):
+        self.prompt_manager = get_prompt_manager()
         self.patient_agent = PatientAgent(patient_info)
         self.counselor_agent = CounselorAgent(is_first_session)
         self.dialogue_manager = DialogueManager()
@@ -287,20 +288,27 @@ class ConversationSession:
             "original_dialogue_history": []  # 保存原始对话历史（未经R1修改的咨询师回复）
         }
         self.current_counselor_round = 0  # 当前咨询师回复轮次计数器
+        self.on_turn = on_turn  # 每条消息加入对话后回调 (role, content)，用于增量保存
         
         logger.info(f"Session initialized: {'first' if is_first_session else 'subsequent'}, mode: {conversation_mode}")
     
+    def _add_message(self, role: str, content: str, metadata: Optional[Dict] = None):
+        """Add a message to the dialogue and notify the on_turn callback."""
+        self.dialogue_manager.add_message(role, content, metadata)
+        if self.on_turn is not None:
+            self.on_turn(role, content)
+    
     def start_session(self) -> str:
         """Start the conversation session."""
         # Generate opening statement based on mode
         if self.dialogue_manager.mode == ConversationMode.DOCTOR_FIRST:
             opening = self.prompt_manager.openings.get_random_opening("counselor")
-            self.dialogue_manager.add_message("咨询师", opening)
+            self._add_message("咨询师", opening)
             logger.info(f"Session started with counselor opening: {opening}")
             return opening
         else:
             opening = self.prompt_manager.openings.get_random_opening("general")
-            self.dialogue_manager.add_message("求助者", opening)
+            self._add_message("求助者", opening)
             logger.info(f"Session started with patient opening: {opening}")
             return opening
     
@@ -382,7 +390,7 @@ class ConversationSession:
                 )
             
             # Add message to dialogue manager
-            self.dialogue_manager.add_message(role, agent_response.content, agent_response.metadata)
+            self._add_message(role, agent_response.content, agent_response.metadata)
             
             return role, agent_response.content, agent_response
             
@@ -36,6 +36,16 @@ class ModelConfig:
     REASONING_TEMPERATURE: float = 0.9
     MAX_RETRIES: int = 3
     RETRY_DELAY: int = 1
+    
+    # Request response_format={"type": "json_object"} from the reasoning model.
+    # Only enable for backends/models that support JSON mode.
+    REASONING_JSON_MODE: bool = False
+    
+    # Backend concurrency (in-flight requests shared by all sessions)
+    # AIMD: start at INITIAL, +1 after AIMD_INCREASE_AFTER successes, halve on rate limit
+    INITIAL_CONCURRENT_REQUESTS: int = 3
+    MAX_CONCURRENT_REQUESTS: int = 32
+    AIMD_INCREASE_AFTER: int = 20
 
 
 @dataclass
@@ -56,6 +66,19 @@ class SystemConfig:
     # File processing
     LOG_FILE: str = "processed_file.log"
     
+    # Reuse reasoning results for identical first evaluations (same summary, response and turn)
+    CACHE_REASONING_RESULTS: bool = True
+    
+    # Entries kept per SentenceRewriter for repeated (sentence, context, temperature) rewrites (0 disables)
+    REWRITE_CACHE_SIZE: int = 4096
+    
+    # Append each dialogue turn to dialogue_files/{name}_dialogue.ndjson while a session runs,
+    # so an interrupted session's turns survive; the log is removed once the JSON files are saved
+    STREAM_DIALOGUE_TURNS: bool = False
+    
+    # Persist R1 chain-of-thought (reasoning_content) in reasoning files
+    STORE_REASONING_CHAINS: bool = True
+    
     # CBT model age thresholds
     CBT_WITH_SUGGESTION_THRESHOLD: int = 400
     CBT_WITHOUT_SUGGESTION_THRESHOLD: int = 700
@@ -70,6 +93,9 @@ class PathConfig:
     HALF_SUGGESTION_PATH: str = "Ahalf_suggestion"
     WITHOUT_SUGGESTION_PATH: str = "Awithout_suggestion"
     
+    # SQLite file backing the reasoning cache across runs ("" keeps it in memory only)
+    REASONING_CACHE_DB: str = ""
+    
     # File extensions
     JSON_EXT: str = ".json"
     TXT_EXT: str = ".txt"
@@ -9,7 +9,7 @@ import json
 import logging
 from .config import config
 from .llm_client import get_llm_client
-from .prompts import PromptManager
+from .prompts import get_prompt_manager
 
 logger = logging.getLogger(__name__)
 
@@ -30,11 +30,14 @@ class DialogueHistory:
         self.turns: List[ConversationTurn] = []
         self.summary_history: List[str] = []
         self.current_summary: str = ""
+        self.summarized_turn_count: int = 0  # Turns covered by current_summary
+        self.role_counts: Dict[str, int] = {}  # Per-role turn counts, kept up to date on add
         
     def add_turn(self, role: str, content: str, metadata: Optional[Dict] = None):
         """Add a conversation turn."""
         turn = ConversationTurn(role=role, content=content, metadata=metadata)
         self.turns.append(turn)
+        self.role_counts[role] = self.role_counts.get(role, 0) + 1
         logger.debug(f"Added turn: {role} - {content[:50]}...")
     
     def get_turns(self) -> List[ConversationTurn]:
@@ -137,8 +140,10 @@ class DialogueHistory:
     def clear(self):
         """Clear all conversation history."""
         self.turns.clear()
+        self.role_counts.clear()
         self.summary_history.clear()
         self.current_summary = ""
+        self.summarized_turn_count = 0
         logger.info("Conversation history cleared")
     
     def to_json(self) -> str:
@@ -154,7 +159,8 @@ class DialogueHistory:
                 for turn in self.turns
             ],
             "summary_history": self.summary_history,
-            "current_summary": self.current_summary
+            "current_summary": self.current_summary,
+            "summarized_turn_count": self.summarized_turn_count
         }
         return json.dumps(data, ensure_ascii=False, indent=2)
     
@@ -172,9 +178,11 @@ class DialogueHistory:
                 metadata=turn_data.get("metadata")
             )
             history.turns.append(turn)
+            history.role_counts[turn.role] = history.role_counts.get(turn.role, 0) + 1
         
         history.summary_history = data.get("summary_history", [])
         history.current_summary = data.get("current_summary", "")
+        history.summarized_turn_count = data.get("summarized_turn_count", 0)
         
         return history
 
@@ -183,7 +191,7 @@ class SummaryManager:
     """Manages conversation summarization."""
     
     def __init__(self):
-        self.prompt_manager = PromptManager()
+        self.prompt_manager = get_prompt_manager()
         self.llm_client = get_llm_client()
     
     def should_summarize(self, dialogue_history: DialogueHistory) -> bool:
@@ -201,21 +209,30 @@ class SummaryManager:
         
         return False
     
-    def generate_summary(self, dialogue_history: DialogueHistory) -> str:
-        """Generate summary for the conversation."""
+    def generate_summary(self, dialogue_history: DialogueHistory) -> Optional[str]:
+        """Generate summary for the conversation, or None if generation failed."""
         try:
             # Get recent turns for context
             recent_turns = dialogue_history.get_recent_turns(config.system.SUMMARY_RECENT_TURNS)
             
-            # Prepare content for summarization
-            full_history = dialogue_history.to_dict_format()
+            # Prepare content for summarization. Once a summary exists, send it
+            # plus the turns it does not cover instead of the full history, so the
+            # prompt stays bounded as the session grows.
+            if dialogue_history.current_summary:
+                new_content = [
+                    {turn.role: turn.content}
+                    for turn in dialogue_history.turns[dialogue_history.summarized_turn_count:]
+                ]
+                history_content = f"历史对话摘要：{dialogue_history.current_summary}。当前聊天记录：{str(new_content)}"
+            else:
+                history_content = str(dialogue_history.to_dict_format())
             recent_content = [
                 {turn.role: turn.content} for turn in recent_turns
             ]
             
             # Generate summary using the prompt manager
             messages = self.prompt_manager.get_summary_prompt(
-                str(full_history),
+                history_content,
                 str(recent_content)
             )
             
@@ -226,7 +243,7 @@ class SummaryManager:
             
         except Exception as e:
             logger.error(f"Error generating summary: {e}")
-            return f"Summary generation failed: {str(e)}"
+            return None
     
     def execute_summary(self, dialogue_history: DialogueHistory) -> Tuple[str, str]:
         """
@@ -245,28 +262,41 @@ class SummaryManager:
         if self.should_summarize(dialogue_history):
             # Generate new summary
             new_summary = self.generate_summary(dialogue_history)
-            dialogue_history.current_summary = new_summary
-            dialogue_history.summary_history.append(new_summary)
-            logger.info("Generated new summary")
-            return new_summary, new_summary
-        else:
-            # Use existing summary + new content
+            if new_summary is not None:
+                dialogue_history.current_summary = new_summary
+                dialogue_history.summarized_turn_count = turn_count
+                dialogue_history.summary_history.append(new_summary)
+                logger.info("Generated new summary")
+                return new_summary, new_summary
+            
+            # Keep the previous summary and its coverage so the next summary
+            # still includes the turns this attempt failed to cover
+            logger.warning("Summary generation failed, keeping the previous summary")
             if dialogue_history.current_summary:
-                # Calculate how much new content to include
-                buffer_size = config.system.SUMMARY_BUFFER_SIZE
-                start_index = buffer_size * ((turn_count - 1) // buffer_size) + 1
-                new_turns = dialogue_history.turns[start_index:]
                 new_content = [
-                    {turn.role: turn.content} for turn in new_turns
+                    {turn.role: turn.content}
+                    for turn in dialogue_history.turns[dialogue_history.summarized_turn_count:]
                 ]
-                
                 content = f"历史对话摘要：{dialogue_history.current_summary}。当前聊天记录：{str(new_content)}"
-                logger.info(f"Added {len(new_turns)} turns to existing summary")
-                return content, dialogue_history.current_summary
-            else:
-                # No summary yet, use full history
-                content = str(dialogue_history.to_dict_format())
                 return content, dialogue_history.current_summary
+        
+        # Use existing summary + new content
+        if dialogue_history.current_summary:
+            # Calculate how much new content to include
+            buffer_size = config.system.SUMMARY_BUFFER_SIZE
+            start_index = buffer_size * ((turn_count - 1) // buffer_size) + 1
+            new_turns = dialogue_history.turns[start_index:]
+            new_content = [
+                {turn.role: turn.content} for turn in new_turns
+            ]
+            
+            content = f"历史对话摘要：{dialogue_history.current_summary}。当前聊天记录：{str(new_content)}"
+            logger.info(f"Added {len(new_turns)} turns to existing summary")
+            return content, dialogue_history.current_summary
+        else:
+            # No summary yet, use full history
+            content = str(dialogue_history.to_dict_format())
+            return content, dialogue_history.current_summary
 
 
 class ConversationMode:
@@ -282,7 +312,7 @@ class DialogueManager:
         self.history = DialogueHistory()
         self.summary_manager = SummaryManager()
         self.mode = ConversationMode.PATIENT_FIRST
-        self.prompt_manager = PromptManager()
+        self.prompt_manager = get_prompt_manager()
     
     def set_mode(self, mode: str):
         """Set conversation mode."""
@@ -348,8 +378,8 @@ class DialogueManager:
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get conversation statistics."""
-        counselor_turns = sum(1 for turn in self.history.turns if turn.role == "咨询师")
-        patient_turns = sum(1 for turn in self.history.turns if turn.role == "求助者")
+        counselor_turns = self.history.role_counts.get("咨询师", 0)
+        patient_turns = self.history.role_counts.get("求助者", 0)
         
         return {
             "total_turns": self.history.get_turn_count(),
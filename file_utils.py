@@ -5,15 +5,38 @@ Handles file operations, logging, and data persistence.
 
 import os
 import json
+import shutil
 import logging
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Set
 from pathlib import Path
 from datetime import datetime
 from .config import config
 
+# Optional fast JSON serializer
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=4096)
+def _read_text_cached(file_path: str, mtime_ns: int, size: int) -> str:
+    """Read a text file; cached on (path, mtime, size) so edits invalidate the entry."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def _read_text(file_path: str) -> str:
+    """Read a text file through the stat-keyed cache."""
+    stat = os.stat(file_path)
+    return _read_text_cached(file_path, stat.st_mtime_ns, stat.st_size)
+
+
 class FileManager:
     """Handles file operations for the counseling system."""
     
@@ -55,8 +78,16 @@ class FileManager:
             # Ensure directory exists
             Path(file_path).parent.mkdir(parents=True, exist_ok=True)
             
-            with open(file_path, 'w', encoding='utf-8') as file:
-                json.dump(data, file, ensure_ascii=False, indent=indent)
+            # orjson only supports 2-space indentation
+            if HAS_ORJSON and indent in (None, 2):
+                option = orjson.OPT_NON_STR_KEYS
+                if indent:
+                    option |= orjson.OPT_INDENT_2
+                with open(file_path, 'wb') as file:
+                    file.write(orjson.dumps(data, option=option))
+            else:
+                with open(file_path, 'w', encoding='utf-8') as file:
+                    json.dump(data, file, ensure_ascii=False, indent=indent)
             
             logger.debug(f"Successfully wrote JSON file: {file_path}")
             return True
@@ -67,8 +98,7 @@ class FileManager:
     def read_text_file(self, file_path: str) -> Optional[str]:
         """Read a text file."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            return _read_text(file_path)
         except FileNotFoundError:
             logger.error(f"File not found: {file_path}")
             return None
@@ -172,6 +202,20 @@ class ProcessingLog:
             except Exception as e:
                 logger.error(f"Error updating log file: {e}")
     
+    def mark_processed_batch(self, filenames: List[str]):
+        """Mark several files as processed with a single log write."""
+        new_files = [name for name in dict.fromkeys(filenames) if name not in self.processed_files]
+        if not new_files:
+            return
+        
+        self.processed_files.update(new_files)
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(''.join(name + '\n' for name in new_files))
+            logger.debug(f"Marked {len(new_files)} files as processed")
+        except Exception as e:
+            logger.error(f"Error updating log file: {e}")
+    
     def get_processed_files(self) -> Set[str]:
         """Get set of processed files."""
         return self.processed_files.copy()
@@ -187,6 +231,35 @@ class ProcessingLog:
             logger.error(f"Error clearing log file: {e}")
 
 
+class SessionResultWriter:
+    """Appends dialogue turns to an NDJSON file while a session is running."""
+    
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = None
+    
+    def write_turn(self, entry: Dict[str, Any]):
+        """Append one dialogue entry; the file is opened on the first turn."""
+        try:
+            if self._file is None:
+                Path(self.file_path).parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.file_path, 'wb')
+            if HAS_ORJSON:
+                line = orjson.dumps(entry)
+            else:
+                line = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+            # Buffered: lines reach the disk as the buffer fills and on close()
+            self._file.write(line + b"\n")
+        except Exception as e:
+            logger.error(f"Error writing turn to {self.file_path}: {e}")
+    
+    def close(self):
+        """Close the underlying file if it was opened."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
 class SessionDataManager:
     """Manages session data saving and loading."""
     
@@ -240,23 +313,32 @@ class SessionDataManager:
             modification_file = f"modification_files/{filename}_comment.json"
             original_file = f"original_files/{filename}_original_dialogue.json"
             
-            # Save all files
+            # Save all files with a 2-space indent: it is the only indent orjson produces,
+            # and the json fallback writes the same layout, so the files do not depend on it
+            indent = 2
+            write = self.file_manager.write_json_file
             success = True
-            success &= self.file_manager.write_json_file(dialogue_file, dialogue_history)
+            success &= write(dialogue_file, dialogue_history, indent=indent)
             
             # Use grouped reasoning history if available, otherwise use flat structure
             if reasoning_history_by_round:
-                success &= self.file_manager.write_json_file(reasoning_file, reasoning_history_by_round)
+                success &= write(reasoning_file, reasoning_history_by_round, indent=indent)
                 logger.info(f"💾 Saved reasoning results grouped by rounds: {len(reasoning_history_by_round)} rounds")
             else:
-                success &= self.file_manager.write_json_file(reasoning_file, reasoning_history)
+                success &= write(reasoning_file, reasoning_history, indent=indent)
                 logger.info(f"💾 Saved reasoning results (flat structure): {len(reasoning_history)} evaluations")
             
-            success &= self.file_manager.write_json_file(summary_file, summary_history)
-            success &= self.file_manager.write_json_file(modification_file, modification_history)
-            success &= self.file_manager.write_json_file(original_file, original_history)
+            success &= write(summary_file, summary_history, indent=indent)
+            success &= write(modification_file, modification_history, indent=indent)
+            if original_history is dialogue_history and success:
+                # Same list as the dialogue: copy the serialized file instead of dumping it twice
+                shutil.copyfile(dialogue_file, original_file)
+            else:
+                success &= write(original_file, original_history, indent=indent)
             
             if success:
+                # The JSON dialogue file is now the record; drop the streamed turn log
+                self.discard_turn_log(filename)
                 logger.info(f"Successfully saved session results for {filename}")
                 logger.info(f"Files saved to folders:")
                 logger.info(f"  - dialogue_files/{filename}_dialogue.json")
@@ -273,6 +355,28 @@ class SessionDataManager:
             logger.error(f"Error saving session results for {filename}: {e}")
             return False
     
+    def open_turn_writer(self, filename: str) -> SessionResultWriter:
+        """Create a writer that streams dialogue turns to dialogue_files/{filename}_dialogue.ndjson."""
+        return SessionResultWriter(self._turn_log_path(filename))
+    
+    def discard_turn_log(self, filename: str):
+        """
+        Delete the streamed turn log once the session's JSON files are saved.
+        
+        The log is kept when saving fails (or the session never finishes) so the
+        turns of an interrupted session can still be recovered.
+        """
+        try:
+            os.remove(self._turn_log_path(filename))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not remove turn log for {filename}: {e}")
+    
+    @staticmethod
+    def _turn_log_path(filename: str) -> str:
+        return f"dialogue_files/{filename}_dialogue.ndjson"
+    
     def load_session_results(self, filename: str) -> Optional[Dict[str, Any]]:
         """Load session results from files in different folders."""
         try:
@@ -350,8 +454,7 @@ class ConfigLoader:
     def load_patient_profile(file_path: str) -> Optional[str]:
         """Load patient profile from file."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read().strip()
+            return _read_text(file_path).strip()
         except FileNotFoundError:
             logger.error(f"Patient profile not found: {file_path}")
             return None
@@ -4,6 +4,7 @@ Handles all AI service interactions with proper error handling and retry logic.
 """
 
 import time
+import threading
 from typing import Dict, List, Any, Tuple, Optional
 from .config import config
 import logging
@@ -16,6 +17,12 @@ except ImportError:
     HAS_OPENAI = False
     OpenAI = None
 
+# httpx client pre-configured with the SDK's own timeout and redirect defaults
+try:
+    from openai import DefaultHttpxClient
+except ImportError:
+    DefaultHttpxClient = None
+
 try:
     from zhipuai import ZhipuAI
     HAS_ZHIPUAI = True
@@ -31,6 +38,14 @@ except ImportError:
     HAS_DASHSCOPE = False
     dashscope = None
 
+# HTTP transport shared by the OpenAI-compatible clients (installed with openai)
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+    httpx = None
+
 try:
     import requests
     HAS_REQUESTS = True
@@ -48,38 +63,103 @@ class LLMClientError(Exception):
     pass
 
 
+def _is_rate_limit_error(error: Optional[BaseException]) -> bool:
+    """
+    Check whether an exception signals backend saturation (HTTP 429).
+    
+    Only the status code and the SDK's RateLimitError type count; the message text
+    is not inspected, since token counts or request ids may also contain "429".
+    """
+    if error is None:
+        return False
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+class AdaptiveRequestLimiter:
+    """
+    Limits in-flight backend requests with an AIMD window.
+    
+    The window grows by one after a streak of successful requests and is
+    halved whenever a request is rejected with a rate-limit error.
+    """
+    
+    def __init__(self, initial: int, maximum: int, increase_after: int):
+        self.maximum = max(1, maximum)
+        self.limit = min(max(1, initial), self.maximum)
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+    
+    def __enter__(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        with self._condition:
+            self._in_flight -= 1
+            if _is_rate_limit_error(exc):
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                logger.warning(f"Rate limited by backend, concurrency limit lowered to {self.limit}")
+            elif exc is None:
+                self._successes += 1
+                if self._successes >= self.increase_after and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+        return False
+
+
 class LLMClient:
     """Manages all LLM client interactions."""
     
     def __init__(self):
         """Initialize all LLM clients."""
+        # Shared request queue: every session thread competes for the same
+        # in-flight slots, so backend load is bounded independently of how
+        # many sessions are running. The slot count adapts to rate limiting.
+        self._request_slots = AdaptiveRequestLimiter(
+            config.model.INITIAL_CONCURRENT_REQUESTS,
+            config.model.MAX_CONCURRENT_REQUESTS,
+            config.model.AIMD_INCREASE_AFTER
+        )
         self._initialize_clients()
     
     def _initialize_clients(self):
         """Initialize all AI service clients."""
         self.available_clients = []
         
+        # One keep-alive connection pool shared by every OpenAI-compatible client
+        self.http_client = self._create_http_client()
+        
         # Initialize OpenAI-compatible clients
         if HAS_OPENAI:
             try:
                 # Initialize Qwen client
                 self.qwen_client = OpenAI(
                     api_key=config.api.QWEN_API_KEY,
-                    base_url=config.api.QWEN_BASE_URL
+                    base_url=config.api.QWEN_BASE_URL,
+                    http_client=self.http_client
                 )
                 self.available_clients.append("qwen")
                 
                 # Initialize Moonshot client
                 self.moonshot_client = OpenAI(
                     api_key=config.api.MOONSHOT_API_KEY,
-                    base_url=config.api.MOONSHOT_BASE_URL
+                    base_url=config.api.MOONSHOT_BASE_URL,
+                    http_client=self.http_client
                 )
                 self.available_clients.append("moonshot")
                 
                 # Initialize OpenAI proxy client
                 self.openai_proxy_client = OpenAI(
                     api_key=config.api.OPENAI_PROXY_API_KEY,
-                    base_url=config.api.OPENAI_PROXY_BASE_URL
+                    base_url=config.api.OPENAI_PROXY_BASE_URL,
+                    http_client=self.http_client
                 )
                 self.available_clients.append("openai_proxy")
                 
@@ -105,7 +185,8 @@ class LLMClient:
             try:
                 self.deepseek_client = OpenAI(
                     api_key=config.api.QWEN_API_KEY,
-                    base_url=config.api.QWEN_BASE_URL
+                    base_url=config.api.QWEN_BASE_URL,
+                    http_client=self.http_client
                 )  # Initialize as needed
                 self.available_clients.append("deepseek")
             except Exception as e:
@@ -113,6 +194,25 @@ class LLMClient:
         
         logger.info(f"LLM clients initialized successfully. Available clients: {self.available_clients}")
     
+    def _create_http_client(self) -> Optional[Any]:
+        """Create the shared HTTP connection pool, sized to the request limit.
+        
+        Only the pool limits differ from the client the SDK would build itself;
+        without DefaultHttpxClient each client falls back to its own pool.
+        """
+        if not HAS_HTTPX or DefaultHttpxClient is None:
+            return None
+        try:
+            return DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=config.model.MAX_CONCURRENT_REQUESTS,
+                    max_keepalive_connections=config.model.MAX_CONCURRENT_REQUESTS
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Failed to create shared HTTP client: {e}")
+            return None
+    
     def is_client_available(self, model_name: str) -> bool:
         """Check if a client is available for the given model."""
         if model_name.startswith("qwen"):
@@ -169,11 +269,12 @@ class LLMClient:
         
         for attempt in range(max_retries):
             try:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    **kwargs
-                )
+                with self._request_slots:
+                    response = client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        **kwargs
+                    )
                 return response.choices[0].message
                 
             except Exception as e:
@@ -237,11 +338,17 @@ class LLMClient:
         
         while completion is None or (hasattr(completion, 'content') and completion.content == timeout_response):
             try:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature
-                )
+                request_kwargs = {}
+                if config.model.REASONING_JSON_MODE:
+                    request_kwargs["response_format"] = {"type": "json_object"}
+                
+                with self._request_slots:
+                    response = client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        **request_kwargs
+                    )
                 completion = response.choices[0].message
                 
                 # Check if response has reasoning content
@@ -5,10 +5,13 @@ Coordinates all modules and provides the primary interface.
 
 import os
 import re
+import bisect
 import logging
 from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+import atexit
 import threading
 from .config import config
 from .agents import ConversationSession, PatientAgent, CounselorAgent, get_session_manager
@@ -20,7 +23,7 @@ from .file_utils import (
     ConfigLoader
 )
 from .llm_client import get_llm_client
-from .prompts import PromptManager
+from .prompts import get_prompt_manager
 
 # Set up logging
 logging.basicConfig(
@@ -29,6 +32,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Dialogue ID embedded in dialogue filenames
+_DIGITS_RE = re.compile(r'\d+')
+
+# Fixed system prompts for CBT model generation; only the user turn varies per file
+_EVENTS_SYSTEM_PROMPT = "##任务：根据咨询师与求助则的对话内容，生成三个会出发用户负面情绪的场景。#格式：{\"场景一\":xxxx ,\"场景二\":xxxx,\"场景三\":xxx}.#注意事项：请严格按照格式输出，不要输出其他无关的解释。}"
+_REACTION_SYS_WITH = """请你按照用户简历的认知模型以及简历中"你的成长方向（初步建议）"，生成用户"完全按照"你的成长方向（初步建议）"中的内容去应对事件时的情绪，想法和行为。#输出格式：{\"场景号\":{\"情绪\"：,\"想法\":,\"行为\":}}"""
+_REACTION_SYS_HALF = """请你按照用户简历的认知模型，以第二人称的口吻生成用户"部分按照"你的成长方向（初步建议）"中的内容去应对事件时的情绪，想法和行为。#输出格式：{\"场景号\":{\"情绪\"：,\"想法\":,\"行为\":}}"""
+_REACTION_SYS_WITHOUT = "请你按照用户简历的认知模型，以第二人称的口吻生成用户忽略'你的成长方向(初步建议)'中的内容去应对事件时的情绪，想法和行为。#输出格式：{\"场景号\":{\"情绪\"：,\"想法\":,\"行为\":}}"
+_REACTION_SYSTEM_PROMPTS = (_REACTION_SYS_WITH, _REACTION_SYS_HALF, _REACTION_SYS_WITHOUT)
+
+
+def _strip_reasoning_chains(reasoning_history: List[Dict]) -> List[Dict]:
+    """Return reasoning entries without their reasoning_content field."""
+    return [
+        {key: value for key, value in entry.items() if key != "reasoning_content"}
+        for entry in reasoning_history
+    ]
+
 
 class CounselingSystemApp:
     """Main application class for the counseling system."""
@@ -39,10 +60,16 @@ class CounselingSystemApp:
         self.processing_log = get_processing_log()
         self.session_manager = get_session_manager()
         self.llm_client = get_llm_client()
-        self.prompt_manager = PromptManager()
+        self.prompt_manager = get_prompt_manager()
         
-        # 添加线程锁用于并发安全
-        self._processing_lock = threading.Lock()
+        # 会话结果交给后台写入线程保存，工作线程无需等待文件写入；
+        # 保存失败的文件名记录下来，由flush_writes()交给调用方
+        self._write_queue = queue.Queue()
+        self._write_failures: List[str] = []
+        self._write_failures_lock = threading.Lock()
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="session-writer", daemon=True)
+        self._writer_thread.start()
+        atexit.register(self._flush_writes_at_exit)
         
         logger.info("Counseling system initialized")
     
@@ -50,15 +77,24 @@ class CounselingSystemApp:
                           patient_info: str,
                           filename: str,
                           is_first_session: bool = True,
-                          conversation_mode: str = ConversationMode.PATIENT_FIRST) -> Dict[str, Any]:
+                          conversation_mode: str = ConversationMode.PATIENT_FIRST,
+                          source_filename: Optional[str] = None) -> Dict[str, Any]:
         """
         Run a single counseling session.
         
+        Saving is asynchronous: the results are queued for the background writer and
+        this method returns before they are on disk. The file is recorded in the
+        processing log only after its results are saved, so a session lost to a crash
+        before then is simply run again later. Call flush_writes() to wait for the
+        queued saves and get the names of any that failed.
+        
         Args:
             patient_info: Patient information and profile
             filename: Base filename for saving results
             is_first_session: Whether this is the first session
             conversation_mode: Conversation mode (patient-first or doctor-first)
+            source_filename: Profile file name to also record in the processing log
+                once the results are saved
             
         Returns:
             Dictionary containing session results
@@ -66,21 +102,32 @@ class CounselingSystemApp:
         try:
             logger.info(f"Starting session for {filename}")
             
+            # Optionally journal each turn as it happens (crash recovery);
+            # the JSON files written at the end remain the record
+            turn_writer = None
+            on_turn = None
+            if config.system.STREAM_DIALOGUE_TURNS:
+                turn_writer = self.session_data_manager.open_turn_writer(filename)
+                on_turn = lambda role, content: turn_writer.write_turn({role: content})
+            
             # Create session
             session = ConversationSession(
                 patient_info=patient_info,
                 is_first_session=is_first_session,
-                conversation_mode=conversation_mode
+                conversation_mode=conversation_mode,
+                on_turn=on_turn
             )
             
             # Run the session
-            session_results = session.run_full_session()
+            try:
+                session_results = session.run_full_session()
+            finally:
+                if turn_writer is not None:
+                    turn_writer.close()
             
-            # Save session results
-            self._save_session_results(filename, session_results)
-            
-            # Mark file as processed
-            self.processing_log.mark_processed(filename)
+            # Save session results and mark file as processed on the writer thread
+            processed_names = [filename] if source_filename is None else [filename, source_filename]
+            self._write_queue.put((filename, session_results, processed_names))
             
             logger.info(f"Session completed for {filename}")
             
@@ -90,8 +137,57 @@ class CounselingSystemApp:
             logger.error(f"Error running session for {filename}: {e}")
             return {"error": str(e)}
     
-    def _save_session_results(self, filename: str, session_results: Dict[str, Any]):
-        """Save session results to files."""
+    def _writer_loop(self):
+        """
+        Background writer: save queued session results, then mark them processed.
+        
+        This is the only place that updates the processing log, so a file is never
+        logged before its results are written.
+        """
+        while True:
+            filename, session_results, processed_names = self._write_queue.get()
+            saved = False
+            try:
+                saved = self._save_session_results(filename, session_results)
+                if saved:
+                    self.processing_log.mark_processed_batch(processed_names)
+            except Exception as e:
+                logger.error(f"Error in session writer for {filename}: {e}")
+            finally:
+                if not saved:
+                    with self._write_failures_lock:
+                        self._write_failures.append(filename)
+                self._write_queue.task_done()
+    
+    def flush_writes(self) -> List[str]:
+        """
+        Block until every queued session result has been written.
+        
+        Returns:
+            Base filenames whose results failed to save since the last call. These
+            files are not marked as processed.
+        """
+        self._write_queue.join()
+        with self._write_failures_lock:
+            failures, self._write_failures = self._write_failures, []
+        return failures
+    
+    def _flush_writes_at_exit(self):
+        """Finish queued writes at interpreter exit and report any that failed."""
+        failures = self.flush_writes()
+        if failures:
+            logger.error(f"Failed to save session results for: {', '.join(failures)}")
+    
+    def _apply_write_failures(self, results: Dict[str, Any]):
+        """Wait for queued writes and count sessions whose results failed to save as errors."""
+        for base_filename in self.flush_writes():
+            if results["session_results"].pop(base_filename, None) is not None:
+                results["processed"] -= 1
+            results["errors"] += 1
+            logger.error(f"Session results for {base_filename} were not saved")
+    
+    def _save_session_results(self, filename: str, session_results: Dict[str, Any]) -> bool:
+        """Save session results to files. Returns whether every file was written."""
         try:
             # Extract data from session results
             dialogue_history = session_results.get("dialogue_history", [])  # 经过R1推理修改的最终对话
@@ -101,9 +197,18 @@ class CounselingSystemApp:
             summary_history = session_results.get("session_data", {}).get("summary_history", [])
             modification_history = session_results.get("session_data", {}).get("modification_history", [])
             
+            # Drop the verbose chain-of-thought unless configured to keep it
+            if not config.system.STORE_REASONING_CHAINS:
+                reasoning_history = _strip_reasoning_chains(reasoning_history)
+                reasoning_history_by_round = [
+                    {**round_data, "reasoning_history": _strip_reasoning_chains(round_data.get("reasoning_history", []))}
+                    for round_data in reasoning_history_by_round
+                ]
+            
             # Fallback: if no original history is available, use dialogue history as backup
+            # (aliased, not copied; save_session_results detects this and writes it once)
             if not original_history:
-                original_history = dialogue_history.copy()
+                original_history = dialogue_history
                 logger.warning("No original dialogue history found, using dialogue history as fallback")
             
             # Save all session data
@@ -121,9 +226,11 @@ class CounselingSystemApp:
                 logger.info(f"Successfully saved session results for {filename}")
             else:
                 logger.error(f"Failed to save session results for {filename}")
+            return success
                 
         except Exception as e:
             logger.error(f"Error saving session results for {filename}: {e}")
+            return False
     
     def process_patient_folder(self, 
                              folder_path: str,
@@ -154,10 +261,17 @@ class CounselingSystemApp:
                 "session_results": {}
             }
             
+            if not files:
+                logger.info("No patient files found - nothing to process")
+                return results
+            
+            # Snapshot the processing log once; the skip decision only needs the state at start
+            processed_files = self.processing_log.get_processed_files()
+            
             for filename in files:
                 try:
                     # Check if already processed
-                    if self.processing_log.is_processed(filename):
+                    if filename in processed_files:
                         logger.info(f"Skipping already processed file: {filename}")
                         results["skipped"] += 1
                         continue
@@ -192,6 +306,9 @@ class CounselingSystemApp:
                     logger.error(f"Error processing file {filename}: {e}")
                     results["errors"] += 1
             
+            # Wait for the background saves; sessions that failed to save count as errors
+            self._apply_write_failures(results)
+            
             logger.info(f"Folder processing complete. Processed: {results['processed']}, "
                        f"Skipped: {results['skipped']}, Errors: {results['errors']}")
             
@@ -211,7 +328,9 @@ class CounselingSystemApp:
         
         Args:
             folder_path: 包含患者档案的文件夹路径
-            max_workers: 最大并发线程数（默认3个，避免API限制）
+            max_workers: 最大并发会话数（默认3个）。后端请求并发由LLM客户端的
+                共享请求队列统一限制（AIMD自适应，上限为config.model.MAX_CONCURRENT_REQUESTS，
+                遇到限流时减半），因此可以按需调大而不会超出API限制
             is_first_session: 是否为首次会话
             conversation_mode: 对话模式
             
@@ -234,10 +353,11 @@ class CounselingSystemApp:
                 "concurrent_workers": max_workers
             }
             
-            # 过滤出需要处理的文件
+            # 过滤出需要处理的文件（对处理日志做一次快照）
+            processed_files = self.processing_log.get_processed_files()
             files_to_process = []
             for filename in files:
-                if not self.processing_log.is_processed(filename):
+                if filename not in processed_files:
                     files_to_process.append(filename)
                 else:
                     logger.info(f"Skipping already processed file: {filename}")
@@ -249,40 +369,52 @@ class CounselingSystemApp:
             
             logger.info(f"Processing {len(files_to_process)} files with {max_workers} concurrent workers")
             
+            # 预读取所有患者档案，工作线程直接使用内存中的内容而不是文件路径；
+            # 基础文件名（不含扩展名）也只计算一次
+            patient_profiles = {}
+            for filename in files_to_process:
+                patient_info = ConfigLoader.load_patient_profile(os.path.join(folder_path, filename))
+                if patient_info is None:
+                    logger.error(f"Failed to load patient profile: {filename}")
+                    results["errors"] += 1
+                else:
+                    patient_profiles[filename] = (os.path.splitext(filename)[0], patient_info)
+            
             # 使用线程池并发处理
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
                 # 提交所有任务
                 future_to_file = {}
-                for filename in files_to_process:
+                for filename, (base_filename, patient_info) in patient_profiles.items():
                     future = executor.submit(
                         self._process_single_file_concurrent,
-                        folder_path,
                         filename,
+                        base_filename,
+                        patient_info,
                         is_first_session,
                         conversation_mode
                     )
                     future_to_file[future] = filename
                 
-                # 收集结果
+                # 收集结果（仅在当前线程中执行，无需加锁）
                 for future in as_completed(future_to_file):
                     filename = future_to_file[future]
                     try:
                         session_results = future.result()
                         
-                        with self._processing_lock:
-                            if "error" in session_results:
-                                results["errors"] += 1
-                                logger.error(f"Error processing {filename}: {session_results['error']}")
-                            else:
-                                results["processed"] += 1
-                                base_filename = os.path.splitext(filename)[0]
-                                results["session_results"][base_filename] = session_results
-                                logger.info(f"Successfully processed {filename}")
+                        if "error" in session_results:
+                            results["errors"] += 1
+                            logger.error(f"Error processing {filename}: {session_results['error']}")
+                        else:
+                            results["processed"] += 1
+                            results["session_results"][patient_profiles[filename][0]] = session_results
+                            logger.info(f"Successfully processed {filename}")
                                 
                     except Exception as e:
-                        with self._processing_lock:
-                            results["errors"] += 1
-                            logger.error(f"Exception processing {filename}: {e}")
+                        results["errors"] += 1
+                        logger.error(f"Exception processing {filename}: {e}")
+            
+            # 等待后台写入完成（结果保存后由写入线程记录处理日志），保存失败的会话计为错误
+            self._apply_write_failures(results)
             
             logger.info(f"Concurrent processing complete. Processed: {results['processed']}, "
                        f"Skipped: {results['skipped']}, Errors: {results['errors']}")
@@ -294,16 +426,18 @@ class CounselingSystemApp:
             return {"error": str(e)}
     
     def _process_single_file_concurrent(self, 
-                                       folder_path: str,
                                        filename: str,
+                                       base_filename: str,
+                                       patient_info: str,
                                        is_first_session: bool,
                                        conversation_mode: str) -> Dict[str, Any]:
         """
         并发处理单个文件的内部方法。
         
         Args:
-            folder_path: 文件夹路径
             filename: 文件名
+            base_filename: 不含扩展名的文件名，用于保存结果
+            patient_info: 预先读取的患者档案内容
             is_first_session: 是否为首次会话
             conversation_mode: 对话模式
             
@@ -311,28 +445,15 @@ class CounselingSystemApp:
             会话结果字典
         """
         try:
-            # 加载患者档案
-            file_path = os.path.join(folder_path, filename)
-            patient_info = ConfigLoader.load_patient_profile(file_path)
-            
-            if patient_info is None:
-                return {"error": f"Failed to load patient profile: {filename}"}
-            
-            # 提取基础文件名（不含扩展名）
-            base_filename = os.path.splitext(filename)[0]
-            
             # 运行会话
             session_results = self.run_single_session(
                 patient_info=patient_info,
                 filename=base_filename,
                 is_first_session=is_first_session,
-                conversation_mode=conversation_mode
+                conversation_mode=conversation_mode,
+                source_filename=filename
             )
             
-            # 标记文件为已处理
-            with self._processing_lock:
-                self.processing_log.mark_processed(filename)
-            
             return session_results
             
         except Exception as e:
@@ -359,12 +480,6 @@ class CounselingSystemApp:
         try:
             logger.info("Starting CBT model generation")
             
-            # Get existing files to avoid duplicates
-            existing_files = set()
-            for folder in [with_suggestion_path, half_suggestion_path, without_suggestion_path]:
-                if os.path.exists(folder):
-                    existing_files.update(os.listdir(folder))
-            
             # Get dialogue files
             dialogue_files = self.file_manager.list_files(dialogue_folder, "json")
             
@@ -375,10 +490,23 @@ class CounselingSystemApp:
                 "errors": 0
             }
             
+            if not dialogue_files:
+                logger.info("No dialogue files found - nothing to generate")
+                return results
+            
+            # Get existing files to avoid duplicates
+            existing_files = set()
+            for folder in [with_suggestion_path, half_suggestion_path, without_suggestion_path]:
+                try:
+                    with os.scandir(folder) as entries:
+                        existing_files.update(entry.name for entry in entries)
+                except FileNotFoundError:
+                    continue
+            
             for filename in dialogue_files:
                 try:
                     # Extract dialogue ID from filename
-                    match = re.search(r'\d+', filename)
+                    match = _DIGITS_RE.search(filename)
                     if not match:
                         logger.warning(f"Could not extract ID from filename: {filename}")
                         results["errors"] += 1
@@ -452,7 +580,7 @@ class CounselingSystemApp:
             events_prompt = [
                 {
                     "role": "system",
-                    "content": "##任务：根据咨询师与求助则的对话内容，生成三个会出发用户负面情绪的场景。#格式：{\"场景一\":xxxx ,\"场景二\":xxxx,\"场景三\":xxx}.#注意事项：请严格按照格式输出，不要输出其他无关的解释。}"
+                    "content": _EVENTS_SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -467,45 +595,20 @@ class CounselingSystemApp:
             # Generate reactions based on dialogue_id
             dialogue_id_num = int(dialogue_id)
             
-            if dialogue_id_num < config.system.CBT_WITH_SUGGESTION_THRESHOLD:
-                # With suggestion
-                reaction_prompt = [
-                    {
-                        "role": "system",
-                        "content": """请你按照用户简历的认知模型以及简历中"你的成长方向（初步建议）"，生成用户"完全按照"你的成长方向（初步建议）"中的内容去应对事件时的情绪，想法和行为。#输出格式：{\"场景号\":{\"情绪\"：,\"想法\":,\"行为\":}}"""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"简历信息：{cbt_model}。事件：{events_response}"
-                    }
-                ]
-                output_path = with_suggestion_path
-            elif dialogue_id_num < config.system.CBT_WITHOUT_SUGGESTION_THRESHOLD:
-                # Partial suggestion
-                reaction_prompt = [
-                    {
-                        "role": "system",
-                        "content": """请你按照用户简历的认知模型，以第二人称的口吻生成用户"部分按照"你的成长方向（初步建议）"中的内容去应对事件时的情绪，想法和行为。#输出格式：{\"场景号\":{\"情绪\"：,\"想法\":,\"行为\":}}"""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"简历信息：{cbt_model}。事件：{events_response}"
-                    }
-                ]
-                output_path = half_suggestion_path
-            else:
-                # Without suggestion
-                reaction_prompt = [
-                    {
-                        "role": "system",
-                        "content": "请你按照用户简历的认知模型，以第二人称的口吻生成用户忽略'你的成长方向(初步建议)'中的内容去应对事件时的情绪，想法和行为。#输出格式：{\"场景号\":{\"情绪\"：,\"想法\":,\"行为\":}}"
-                    },
-                    {
-                        "role": "user",
-                        "content": f"简历信息：{cbt_model}。事件：{events_response}"
-                    }
-                ]
-                output_path = without_suggestion_path
+            # Bucket 0: with suggestion, 1: partial suggestion, 2: without suggestion.
+            # Thresholds are read per call so runtime config overrides still apply.
+            bucket = bisect.bisect_right(
+                (config.system.CBT_WITH_SUGGESTION_THRESHOLD,
+                 config.system.CBT_WITHOUT_SUGGESTION_THRESHOLD),
+                dialogue_id_num
+            )
+            reaction_system = _REACTION_SYSTEM_PROMPTS[bucket]
+            output_path = (with_suggestion_path, half_suggestion_path, without_suggestion_path)[bucket]
+            
+            reaction_prompt = [
+                {"role": "system", "content": reaction_system},
+                {"role": "user", "content": f"简历信息：{cbt_model}。事件：{events_response}"}
+            ]
             
             # Generate reactions
             reactions, _ = self.llm_client.generate_response(
@@ -550,10 +653,23 @@ class CounselingSystemApp:
                 config.paths.WITHOUT_SUGGESTION_PATH
             ]
             
+            # One scandir per parent directory instead of a stat per required directory
+            dirs_by_parent: Dict[str, List[Tuple[str, str]]] = {}
             for directory in required_dirs:
-                if not os.path.exists(directory):
-                    logger.warning(f"Required directory does not exist: {directory}")
-                    directories_ok = False
+                parent, name = os.path.split(os.path.normpath(directory))
+                dirs_by_parent.setdefault(parent or ".", []).append((name, directory))
+            
+            for parent, children in dirs_by_parent.items():
+                try:
+                    with os.scandir(parent) as entries:
+                        present = {entry.name for entry in entries if entry.is_dir()}
+                except FileNotFoundError:
+                    present = set()
+                
+                for name, directory in children:
+                    if name not in present:
+                        logger.warning(f"Required directory does not exist: {directory}")
+                        directories_ok = False
             
             validation_results = {
                 "config_valid": config_valid,
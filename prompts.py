@@ -3,27 +3,51 @@ Prompt management module for the counseling system.
 Organizes all prompt templates used for different AI interactions.
 """
 
-import random
-from typing import List, Dict, Any
+import json
+import textwrap
+import threading
+from string import Template
+from collections import deque
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+# Optional fast JSON parser
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
+
+def _compact(text: str) -> str:
+    """Drop source indentation and trailing whitespace from a prompt literal, keeping its line structure."""
+    lines = textwrap.dedent(text).strip().splitlines()
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def _json_hint(example: Dict[str, str]) -> str:
+    """Render an answer-format example as compact JSON."""
+    return json.dumps(example, ensure_ascii=False, separators=(",", ":"))
 
 
 class PromptTemplates:
     """Contains all prompt templates used in the counseling system."""
     
-    # System message for patient role
-    PATIENT_SYSTEM_MESSAGE = """
+    # System message for patient role (string.Template: ${patient_info})
+    PATIENT_SYSTEM_MESSAGE = _compact("""
     任务：请扮演一个正在与咨询师聊天的用户角色.
-    个人信息：这是你的个人信息和资料：{patient_info}.
+    个人信息：这是你的个人信息和资料：${patient_info}.
     要求：请基于你的"个人信息"与我对话。每一次回答你只能说一个症状。
     注意事项：1.你应该用一种模糊的和口语化的方式来表达你的症状，并将它们与你的生活经历联系起来
                  2.在谈话过程中，你可能会出现情绪波动。
                  3.你对咨询师有抗拒心理，不想轻易透露一些感觉
                  4.注意：口语化语言、生活经历、情绪低落或情绪波动，有时因抗拒而拒绝回答或者回答的很模糊
                  5.回复中不要包含敏感内容，如果需要的话，请用类似的不敏感词汇替换 
-    """
+    """)
     
     # Initial counseling prompt
-    COUNSELING_INITIAL = """
+    COUNSELING_INITIAL = _compact("""
     对话规则：自然、情感化的回复；遵循角色特点，不做无意义的自问；根据情感做出相应的反应；避免矛盾或重复；回答简洁、一到两句话。
     对话阶段你要顺序的执行一下8个步骤：
         1.设置会话议程
@@ -45,10 +69,10 @@ class PromptTemplates:
         8. 不要一直问用户想聊什么
         9.不要重复说之前说过的话
         10.不要回复每次开头都共情
-    """
+    """)
     
     # CBT conceptualization prompts
-    CBT_CONCEPTUALIZATION_WITH_SUGGESTION = """
+    CBT_CONCEPTUALIZATION_WITH_SUGGESTION = _compact("""
     你是一位认知行为治疗师（CBT Therapist），请根据以下用户与咨询师之间的多轮心理咨询对话，撰写一份认知概念化报告（Cognitive Conceptualization Report）。
 
     **请使用"你"作为主语，即以第二人称视角写报告内容。**
@@ -97,10 +121,23 @@ class PromptTemplates:
       }
      }
     【用户与咨询师对话如下】  
-    """
+    """)
+    
+    # CBT conceptualization prompt without the growth-direction section, derived once at import
+    CBT_CONCEPTUALIZATION_WITHOUT_SUGGESTION = _compact(CBT_CONCEPTUALIZATION_WITH_SUGGESTION.replace(
+        "9. **你的成长方向（可选，初步建议）**", ""
+    ).replace(
+        '"9.你的成长方向（初步建议）": ,', ""
+    ))
+    
+    # CBT conceptualization prompt keyed by with_suggestion
+    CBT_CONCEPTUALIZATION_VARIANTS = {
+        True: CBT_CONCEPTUALIZATION_WITH_SUGGESTION,
+        False: CBT_CONCEPTUALIZATION_WITHOUT_SUGGESTION
+    }
     
     # Summary prompt
-    SUMMARY_PROMPT = """
+    SUMMARY_PROMPT = _compact("""
     #角色：你是一个擅长总结情感咨询对话历史的助手，可以你的任务就是根据咨询师和求助者的聊天历史。
     总结格式为：{
     "对话处于的CBT中的阶段": , 
@@ -122,10 +159,10 @@ class PromptTemplates:
     ##备注："对话处于的CBT中的阶段"是根据对话历史最近几轮内容和"阶段选择"里的"名称"和解释选取对应的阶段"名称"。
     
     #要求：这些总结的字数需要600左右
-    """
+    """)
     
     # SOAP record prompt
-    SOAP_PROMPT = """
+    SOAP_PROMPT = _compact("""
     你是一个心理咨询助手，以下是一次咨询对话的历史记录。你的任务是根据这个对话历史构建SOAP记录文档。请从以下对话中提取并总结出：
     1. **S (Subjective - 主诉)**：用户描述的情感、感受、困扰和症状等。
     2. **O (Objective - 观察)**：咨询师观察到的患者行为、情绪表现和其他客观迹象。
@@ -133,7 +170,135 @@ class PromptTemplates:
     4. **P (Plan - 计划)**：为患者制定的治疗计划或建议。
 
     请注意，SOAP记录的目的是帮助咨询师总结和评估患者的当前状态，制定下一步的治疗方向。
+    """)
+
+
+_PATIENT_SYSTEM_TEMPLATE = Template(PromptTemplates.PATIENT_SYSTEM_MESSAGE)
+
+
+@lru_cache(maxsize=512)
+def _format_patient_system_message(patient_info: str) -> str:
+    """Format the patient system message; cached because a patient's profile recurs every turn."""
+    return _PATIENT_SYSTEM_TEMPLATE.substitute(patient_info=patient_info)
+
+
+# Reasoning evaluator prompt pieces. Only the round-budget clause depends on the
+# current turn; the rest is assembled once at import.
+_FIRST_SESSION_STAGES = """{ 1. 设置议程 2.了解用户的情绪3.获取最新信息4.讨论诊断5.问题识别与目标设定6.向患者解释认知模型7.讨论问题或行为激活8.会话结束总结及布置作业}"""
+_SECOND_SESSION_STAGES = """{**会话的初始部分**:1. 做一个情绪检查。2. 设置议程。3. 获取更新情况。  4. 回顾家庭作业。  5. 确定议程的优先级。**会话的中间部分**  6. 处理一个具体问题，并在该情境中教授认知行为疗法技能。7. 与相关的、共同设定的家庭作业任务进行跟进讨论。  8. 处理第二个问题。  **会话的结束部分**  9. 提供或引导总结。  10. 回顾新的家庭作业任务。  11. 征求反馈意见。}"""
+
+_REASONING_HEAD_PREFIX = "你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，分析当前心理咨询的阶段。评估心理咨询师的当前回复是否恰当且符合具体阶段回答。如果不恰当请提出改进意见,如果发现咨询师的回复已经进入到某阶段，意见中要求咨询师推动对话向你选择的当前阶段的下一阶段过渡，改进意见要"
+_REASONING_HEAD_SUFFIX = "。##注意：改进意见中不要给出参考回复或者例子，不要给出强制咨询师向患者确认聊天主题的建议。通过改进意见保证整个心理咨询流程的顺利推进。确保当前心理咨询师的对话严格按照CBT认知行为疗法的流程进行，合理安排对话长度，且控制对话进程的有效推进保证对话的长度为"
+_FIRST_SESSION_REASONING_HEAD = _REASONING_HEAD_PREFIX + "包括要求口语化，不要说太机械重复的话" + _REASONING_HEAD_SUFFIX
+_SECOND_SESSION_REASONING_HEAD = _REASONING_HEAD_PREFIX + "口语化" + _REASONING_HEAD_SUFFIX
+_FIRST_SESSION_REASONING_FORMAT = "回答格式：" + _json_hint({"结论": "是或者否", "改进意见": "xxxxx", "所处阶段": "对应名称"}) + "。请严格按照回答格式生成回复"
+_SECOND_SESSION_REASONING_FORMAT = "回答格式：" + _json_hint({"结论": "是或者否", "改进意见": "xxxxx", "所处阶段": "xxx"}) + "。请严格按照回答格式生成回复"
+
+# Stage clauses for (more than 5 rounds left, within budget, over budget)
+_FIRST_SESSION_STAGE_CLAUSES = (
+    ',"阶段选择":' + _FIRST_SESSION_STAGES + '.所处阶段请从"阶段选择中选取"',
+    _FIRST_SESSION_STAGES + '。所处阶段请从"阶段选择中选取"',
+    _FIRST_SESSION_STAGES + '。所处阶段请从"阶段选择中选取"。'
+)
+_SECOND_SESSION_STAGE_CLAUSES = (
+    ',"阶段选择":' + _SECOND_SESSION_STAGES + '.所处阶段请从"阶段选择中选取"',
+    '"阶段选择":' + _SECOND_SESSION_STAGES + '。所处阶段请从"阶段选择中选取"',
+    '"阶段选择":' + _SECOND_SESSION_STAGES + '。所处阶段请从"阶段选择中选取"。'
+)
+
+# Revision evaluator system prompt (same for first and subsequent sessions)
+_REVISION_SYSTEM_PROMPT = """你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，且根据改进意见，评估当前咨询师回复修改是否符合改进意见要求。如果还是不恰当，请进一步提出改进意见。如果发现用户不太配合可以跳过当前阶段，没必要一直反复问用户想聊什么。##注意##：1.在改进意见中不要给出参考回复或者例 2.你的任务是推进对话，不要给出建议导致咨询师做对话历史中重复出现的事. "回答格式"：""" + _json_hint({"结论": "是或者否", "改进意见": "xxxxx", "所处阶段": "xxx"}) + "。请严格按照回答格式生成回复"
+
+
+def _loads(text: str) -> Any:
+    """Parse JSON with orjson when available."""
+    return orjson.loads(text) if HAS_ORJSON else json.loads(text)
+
+
+def parse_reasoning_reply(text: str) -> Optional[Tuple[str, str, str]]:
     """
+    Parse a reasoning reply written in the answer format above.
+    
+    Accepts a single JSON object or the two-object form older prompts showed
+    ({"结论":..,"改进意见":..},{"所处阶段":..}); any text around the outermost
+    braces (code fences, preambles) is ignored.
+    
+    Returns:
+        Tuple of (conclusion, improvement_suggestion, current_stage), or None if
+        the reply is not valid JSON; callers then fall back to regex parsing.
+    """
+    if not text:
+        return None
+    
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    candidate = text[start:end + 1]
+    
+    try:
+        data = _loads(candidate)
+    except ValueError:
+        try:
+            data = _loads(f"[{candidate}]")
+        except ValueError:
+            return None
+    
+    if isinstance(data, list):
+        merged: Dict[str, Any] = {}
+        for item in data:
+            if isinstance(item, dict):
+                merged.update(item)
+        data = merged
+    
+    if not isinstance(data, dict) or ("结论" not in data and "改进意见" not in data):
+        return None
+    
+    return (
+        str(data.get("结论", "否")).strip(),
+        str(data.get("改进意见", "需要进一步改进回复内容")).strip(),
+        str(data.get("所处阶段", "未识别")).strip()
+    )
+
+
+def _make_reasoning_builders(head: str, stage_clauses: tuple, answer_format: str) -> tuple:
+    """
+    Specialize the reasoning system prompt for each round-budget bucket.
+    
+    Returns builders for (more than 5 rounds left, within budget, over budget);
+    each takes (upper_round, current_length) and only interpolates the counters.
+    """
+    long_tail = stage_clauses[0] + answer_format
+    mid_tail = stage_clauses[1] + answer_format
+    over_tail = stage_clauses[2] + answer_format
+    
+    def within_long(upper_round: int, current_length: int) -> str:
+        return f"{head}{upper_round},当前长度为：{current_length}{long_tail}"
+    
+    def within_budget(upper_round: int, current_length: int) -> str:
+        return (f"{head}{upper_round},当前长度为：{current_length}"
+                f"请保证在余下{upper_round - current_length}轮内结束本次咨询。{mid_tail}")
+    
+    def over_budget(upper_round: int, current_length: int) -> str:
+        return (f"{head}{upper_round},当前长度为：{current_length}"
+                f",对话已经超过最大轮数{current_length - upper_round}轮，请尽快结束本次咨询。{over_tail}")
+    
+    return within_long, within_budget, over_budget
+
+
+_FIRST_SESSION_BUILDERS = _make_reasoning_builders(
+    _FIRST_SESSION_REASONING_HEAD, _FIRST_SESSION_STAGE_CLAUSES, _FIRST_SESSION_REASONING_FORMAT
+)
+_SECOND_SESSION_BUILDERS = _make_reasoning_builders(
+    _SECOND_SESSION_REASONING_HEAD, _SECOND_SESSION_STAGE_CLAUSES, _SECOND_SESSION_REASONING_FORMAT
+)
+
+
+def _build_reasoning_system_content(builders: tuple, upper_round: int, current_length: int) -> str:
+    """Pick the builder for the current round-budget bucket."""
+    remaining_rounds = upper_round - current_length
+    bucket = 0 if remaining_rounds > 5 else 1 if remaining_rounds >= 0 else 2
+    return builders[bucket](upper_round, current_length)
 
 
 class ReasoningPrompts:
@@ -142,14 +307,9 @@ class ReasoningPrompts:
     @staticmethod
     def get_first_session_prompt(upper_round: int, history: str, user_input: str, dialogue_history: List) -> List[Dict]:
         """Generate reasoning prompt for first session."""
-        remaining_rounds = upper_round - len(dialogue_history)
-        
-        if remaining_rounds > 5:
-            system_content = f"""你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，分析当前心理咨询的阶段。评估心理咨询师的当前回复是否恰当且符合具体阶段回答。如果不恰当请提出改进意见,如果发现咨询师的回复已经进入到某阶段，意见中要求咨询师推动对话向你选择的当前阶段的下一阶段过渡，改进意见要包括要求口语化，不要说太机械重复的话。##注意：改进意见中不要给出参考回复或者例子，不要给出强制咨询师向患者确认聊天主题的建议。通过改进意见保证整个心理咨询流程的顺利推进。确保当前心理咨询师的对话严格按照CBT认知行为疗法的流程进行，合理安排对话长度，且控制对话进程的有效推进保证对话的长度为{upper_round},当前长度为：{len(dialogue_history)},"阶段选择":{ReasoningPrompts._get_first_session_stages()}.所处阶段请从"阶段选择中选取"回答格式：{{"结论":(是或者否)}}","改进意见":xxxxx}},{{"所处阶段":(对应名称)}}。请严格按照回答格式生成回复"""
-        elif remaining_rounds >= 0:
-            system_content = f"""你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，分析当前心理咨询的阶段。评估心理咨询师的当前回复是否恰当且符合具体阶段回答。如果不恰当请提出改进意见,如果发现咨询师的回复已经进入到某阶段，意见中要求咨询师推动对话向你选择的当前阶段的下一阶段过渡，改进意见要包括要求口语化，不要说太机械重复的话。##注意：改进意见中不要给出参考回复或者例子，不要给出强制咨询师向患者确认聊天主题的建议。通过改进意见保证整个心理咨询流程的顺利推进。确保当前心理咨询师的对话严格按照CBT认知行为疗法的流程进行，合理安排对话长度，且控制对话进程的有效推进保证对话的长度为{upper_round},当前长度为：{len(dialogue_history)}请保证在余下{remaining_rounds}轮内结束本次咨询。{ReasoningPrompts._get_first_session_stages()}。所处阶段请从"阶段选择中选取"回答格式：{{"结论":(是或者否)}}","改进意见":xxxxx}},{{"所处阶段":(对应名称)}}。请严格按照回答格式生成回复"""
-        else:
-            system_content = f"""你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，分析当前心理咨询的阶段。评估心理咨询师的当前回复是否恰当且符合具体阶段回答。如果不恰当请提出改进意见,如果发现咨询师的回复已经进入到某阶段，意见中要求咨询师推动对话向你选择的当前阶段的下一阶段过渡，改进意见要包括要求口语化，不要说太机械重复的话。##注意：改进意见中不要给出参考回复或者例子，不要给出强制咨询师向患者确认聊天主题的建议。通过改进意见保证整个心理咨询流程的顺利推进。确保当前心理咨询师的对话严格按照CBT认知行为疗法的流程进行，合理安排对话长度，且控制对话进程的有效推进保证对话的长度为{upper_round},当前长度为：{len(dialogue_history)},对话已经超过最大轮数{len(dialogue_history) - upper_round}轮，请尽快结束本次咨询。{ReasoningPrompts._get_first_session_stages()}。所处阶段请从"阶段选择中选取"。回答格式：{{"结论":(是或者否)}}","改进意见":xxxxx}},{{"所处阶段":(对应名称)}}。请严格按照回答格式生成回复"""
+        system_content = _build_reasoning_system_content(
+            _FIRST_SESSION_BUILDERS, upper_round, len(dialogue_history)
+        )
         
         return [{"role": "system", "content": system_content}, 
                 {"role": "user", "content": f"对话历史：{history}，咨询师回复:{user_input}"}]
@@ -157,14 +317,9 @@ class ReasoningPrompts:
     @staticmethod
     def get_second_session_prompt(upper_round: int, history: str, user_input: str, dialogue_history: List) -> List[Dict]:
         """Generate reasoning prompt for second session."""
-        remaining_rounds = upper_round - len(dialogue_history)
-        
-        if remaining_rounds > 5:
-            system_content = f"""你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，分析当前心理咨询的阶段。评估心理咨询师的当前回复是否恰当且符合具体阶段回答。如果不恰当请提出改进意见,如果发现咨询师的回复已经进入到某阶段，意见中要求咨询师推动对话向你选择的当前阶段的下一阶段过渡，改进意见要口语化。##注意：改进意见中不要给出参考回复或者例子，不要给出强制咨询师向患者确认聊天主题的建议。通过改进意见保证整个心理咨询流程的顺利推进。确保当前心理咨询师的对话严格按照CBT认知行为疗法的流程进行，合理安排对话长度，且控制对话进程的有效推进保证对话的长度为{upper_round},当前长度为：{len(dialogue_history)},"阶段选择":{ReasoningPrompts._get_second_session_stages()}.所处阶段请从"阶段选择中选取"回答格式：{{"结论":(是或者否)}}","改进意见":xxxxx}},{{"所处阶段":xxx}}。请严格按照回答格式生成回复"""
-        elif remaining_rounds >= 0:
-            system_content = f"""你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，分析当前心理咨询的阶段。评估心理咨询师的当前回复是否恰当且符合具体阶段回答。如果不恰当请提出改进意见,如果发现咨询师的回复已经进入到某阶段，意见中要求咨询师推动对话向你选择的当前阶段的下一阶段过渡，改进意见要口语化。##注意：改进意见中不要给出参考回复或者例子，不要给出强制咨询师向患者确认聊天主题的建议。通过改进意见保证整个心理咨询流程的顺利推进。确保当前心理咨询师的对话严格按照CBT认知行为疗法的流程进行，合理安排对话长度，且控制对话进程的有效推进保证对话的长度为{upper_round},当前长度为：{len(dialogue_history)}请保证在余下{remaining_rounds}轮内结束本次咨询。"阶段选择":{ReasoningPrompts._get_second_session_stages()}。所处阶段请从"阶段选择中选取"回答格式：{{"结论":(是或者否)}}","改进意见":xxxxx}},{{"所处阶段":xxx}}。请严格按照回答格式生成回复"""
-        else:
-            system_content = f"""你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，分析当前心理咨询的阶段。评估心理咨询师的当前回复是否恰当且符合具体阶段回答。如果不恰当请提出改进意见,如果发现咨询师的回复已经进入到某阶段，意见中要求咨询师推动对话向你选择的当前阶段的下一阶段过渡，改进意见要口语化。##注意：改进意见中不要给出参考回复或者例子，不要给出强制咨询师向患者确认聊天主题的建议。通过改进意见保证整个心理咨询流程的顺利推进。确保当前心理咨询师的对话严格按照CBT认知行为疗法的流程进行，合理安排对话长度，且控制对话进程的有效推进保证对话的长度为{upper_round},当前长度为：{len(dialogue_history)},对话已经超过最大轮数{len(dialogue_history) - upper_round}轮，请尽快结束本次咨询。"阶段选择":{ReasoningPrompts._get_second_session_stages()}。所处阶段请从"阶段选择中选取"。回答格式：{{"结论":(是或者否)}}","改进意见":xxxxx}},{{"所处阶段":xxx}}。请严格按照回答格式生成回复"""
+        system_content = _build_reasoning_system_content(
+            _SECOND_SESSION_BUILDERS, upper_round, len(dialogue_history)
+        )
         
         return [{"role": "system", "content": system_content}, 
                 {"role": "user", "content": f"对话历史：{history}，咨询师回复:{user_input}"}]
@@ -172,32 +327,28 @@ class ReasoningPrompts:
     @staticmethod
     def get_revision_prompt(history: str, modify_history: str, user_input: str, is_first_session: bool = True) -> List[Dict]:
         """Generate prompt for revision process."""
-        system_content = """你是一名资深的心理咨询师，精通CBT认知行为疗法。请根据咨询师与求助者的对话历史，且根据改进意见，评估当前咨询师回复修改是否符合改进意见要求。如果还是不恰当，请进一步提出改进意见。如果发现用户不太配合可以跳过当前阶段，没必要一直反复问用户想聊什么。##注意##：1.在改进意见中不要给出参考回复或者例 2.你的任务是推进对话，不要给出建议导致咨询师做对话历史中重复出现的事. "回答格式"：{"结论":(是或者否)}","改进意见":xxxxx},{"所处阶段":xxx}。请严格按照回答格式生成回复"""
-        
-        if is_first_session:
-            content = f"对话历史：{history}，修改意见：{modify_history}咨询师回复:{user_input}"
-        else:
-            content = f"对话历史：{history}，修改意见：{modify_history}咨询师回复:{user_input}"
+        # The user turn is the same for first and subsequent sessions
+        content = f"对话历史：{history}，修改意见：{modify_history}咨询师回复:{user_input}"
         
-        return [{"role": "system", "content": system_content}, 
+        return [{"role": "system", "content": _REVISION_SYSTEM_PROMPT}, 
                 {"role": "user", "content": content}]
     
     @staticmethod
     def _get_first_session_stages() -> str:
         """Get the stages definition for first session."""
-        return """{ 1. 设置议程 2.了解用户的情绪3.获取最新信息4.讨论诊断5.问题识别与目标设定6.向患者解释认知模型7.讨论问题或行为激活8.会话结束总结及布置作业}"""
+        return _FIRST_SESSION_STAGES
     
     @staticmethod
     def _get_second_session_stages() -> str:
         """Get the stages definition for second session."""
-        return """{**会话的初始部分**:1. 做一个情绪检查。2. 设置议程。3. 获取更新情况。  4. 回顾家庭作业。  5. 确定议程的优先级。**会话的中间部分**  6. 处理一个具体问题，并在该情境中教授认知行为疗法技能。7. 与相关的、共同设定的家庭作业任务进行跟进讨论。  8. 处理第二个问题。  **会话的结束部分**  9. 提供或引导总结。  10. 回顾新的家庭作业任务。  11. 征求反馈意见。}"""
+        return _SECOND_SESSION_STAGES
 
 
 class OpeningStatements:
     """Contains opening statements for different scenarios."""
     
     # General opening statements for patients
-    GENERAL_OPENINGS = [
+    GENERAL_OPENINGS = (
         "你好，我最近有一些事情让我感到不太舒服，不知道能不能和你聊聊？",
         "我最近心里有点乱，想找个人帮忙理理思路。",
         "我感觉自己的情绪有点不对劲，想听听你的建议。",
@@ -208,10 +359,10 @@ class OpeningStatements:
         "我最近心里有些压力，想找你倾诉一下，不知道你有没有时间？",
         "我有些事情不太明白，想听听你的专业意见。",
         "我最近总是感觉不太好，不知道是不是心理问题，你能帮我看看吗？"
-    ]
+    )
     
     # Second session opening statements
-    SECOND_SESSION_OPENINGS = [
+    SECOND_SESSION_OPENINGS = (
         "上次和您聊完之后，我回去想了很多，也有一些新的感受想和您分享。",
         "最近几天我的情绪有些波动，所以特别想再来和您聊聊。",
         "这段时间我尝试了您上次建议的方法，有一些效果，但也遇到了一些困难。",
@@ -227,10 +378,10 @@ class OpeningStatements:
         "我发现有些模式好像又重复出现了，希望我们可以一起再探讨一下。",
         "我对上次谈话中的一些内容还有疑问，也想进一步展开。",
         "谢谢您上次的帮助，我现在有些新的困扰，希望还能继续得到您的支持。"
-    ]
+    )
     
     # Counselor greetings
-    COUNSELOR_GREETINGS = [
+    COUNSELOR_GREETINGS = (
         "您好！很高兴您能来，我是您的咨询师，让我们坐下来慢慢聊。",
         "你好！我是这里的咨询师，感谢你选择来咨询。我们一起来看看能怎么帮到你。",
         "您好！我是您的咨询师，非常高兴您能来。请随意分享，我在这里听着呢。",
@@ -241,19 +392,39 @@ class OpeningStatements:
         "你好！我是您的咨询师，感谢您勇敢地迈出这一步。请随意谈谈您现在的心情，我们慢慢来。",
         "您好！很高兴您选择来咨询。我是您的咨询师，会尽我所能为您提供支持。请告诉我，您现在最想谈论什么？",
         "你好！欢迎来到这个温馨的咨询空间。我是您的咨询师，愿意倾听您的声音，陪伴您成长。让我们开始吧。"
-    ]
+    )
+    
+    # Opening statements by type; unknown types fall back to general openings
+    _OPENING_MAP = {
+        "general": GENERAL_OPENINGS,
+        "second_session": SECOND_SESSION_OPENINGS,
+        "counselor": COUNSELOR_GREETINGS
+    }
+    
+    # Dedicated generator so opening selection does not share the global random state;
+    # created (and `random` imported) on first use
+    _RNG = None
+    
+    # Shuffled openings still to hand out per type; a pool repeats only after it is used up
+    _pending: Dict[str, deque] = {}
+    _pending_lock = threading.Lock()
     
     @staticmethod
     def get_random_opening(opening_type: str = "general") -> str:
         """Get a random opening statement."""
-        if opening_type == "general":
-            return random.choice(OpeningStatements.GENERAL_OPENINGS)
-        elif opening_type == "second_session":
-            return random.choice(OpeningStatements.SECOND_SESSION_OPENINGS)
-        elif opening_type == "counselor":
-            return random.choice(OpeningStatements.COUNSELOR_GREETINGS)
-        else:
-            return random.choice(OpeningStatements.GENERAL_OPENINGS)
+        if opening_type not in OpeningStatements._OPENING_MAP:
+            opening_type = "general"
+        
+        with OpeningStatements._pending_lock:
+            pending = OpeningStatements._pending.get(opening_type)
+            if not pending:
+                if OpeningStatements._RNG is None:
+                    import random
+                    OpeningStatements._RNG = random.Random()
+                source = OpeningStatements._OPENING_MAP[opening_type]
+                pending = deque(OpeningStatements._RNG.sample(source, len(source)))
+                OpeningStatements._pending[opening_type] = pending
+            return pending.popleft()
 
 
 class PromptManager:
@@ -266,23 +437,18 @@ class PromptManager:
     
     def get_patient_system_message(self, patient_info: str) -> str:
         """Get system message for patient role."""
-        return self.templates.PATIENT_SYSTEM_MESSAGE.format(patient_info=patient_info)
+        return _format_patient_system_message(patient_info)
     
     def get_counselor_system_message(self, additional_info: str = "") -> str:
         """Get system message for counselor role."""
+        # Most turns carry no modification suggestion; return the constant itself
+        if not additional_info:
+            return self.templates.COUNSELING_INITIAL
         return self.templates.COUNSELING_INITIAL + additional_info
     
     def get_cbt_conceptualization_prompt(self, dialogue_content: str, with_suggestion: bool = True) -> List[Dict]:
         """Get CBT conceptualization prompt."""
-        if with_suggestion:
-            prompt = self.templates.CBT_CONCEPTUALIZATION_WITH_SUGGESTION
-        else:
-            # Use the version without suggestion if needed
-            prompt = self.templates.CBT_CONCEPTUALIZATION_WITH_SUGGESTION.replace(
-                "9. **你的成长方向（可选，初步建议）**", ""
-            ).replace(
-                '"9.你的成长方向（初步建议）": ,', ""
-            )
+        prompt = self.templates.CBT_CONCEPTUALIZATION_VARIANTS[bool(with_suggestion)]
         
         return [{"role": "system", "content": prompt}, 
                 {"role": "user", "content": f"对话内容如下：{dialogue_content}"}]
@@ -295,4 +461,13 @@ class PromptManager:
     def get_soap_prompt(self, dialogue_history: str) -> List[Dict]:
         """Get SOAP record prompt."""
         return [{"role": "system", "content": self.templates.SOAP_PROMPT}, 
-                {"role": "user", "content": f"请从以下对话中提取求SOAP记录文档，对话历史：{dialogue_history}"}] 
\ No newline at end of file
+                {"role": "user", "content": f"请从以下对话中提取求SOAP记录文档，对话历史：{dialogue_history}"}]
+
+
+# Global prompt manager instance
+prompt_manager = PromptManager()
+
+
+def get_prompt_manager() -> PromptManager:
+    """Get the global prompt manager instance."""
+    return prompt_manager
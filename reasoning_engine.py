@@ -4,15 +4,64 @@ Handles R1 reasoning logic, evaluation, and modification suggestions.
 """
 
 import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from .config import config
 from .llm_client import get_llm_client
-from .prompts import PromptManager, ReasoningPrompts
+from .prompts import get_prompt_manager, ReasoningPrompts, parse_reasoning_reply
+
+# Optional fast non-cryptographic hash for cache keys
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+    xxhash = None
 
 logger = logging.getLogger(__name__)
 
+# Field patterns for reasoning responses that are not valid JSON
+_CONCLUSION_RE = re.compile(r'"结论"\s*:\s*(".*?"|\S+?)(?=\s*[,}])', re.DOTALL)
+# 改进意见停止在下一个字段或结束符号处
+_SUGGESTION_RE = re.compile(r'"改进意见"\s*:\s*(".*?"|\S.*?)(?=\s*,\s*"所处阶段"|\s*}|\s*$)', re.DOTALL)
+_STAGE_RE = re.compile(r'"所处阶段"\s*:\s*(".*?"|\S.*?)(?=\s*[,}]|\s*$)', re.DOTALL)
+
+
+
+def _scan_loose_field(content: str, key: str) -> Optional[str]:
+    """
+    Find `key` followed by a colon (either width) and return the text up to the
+    next ',' or '}'. Used by the fallback parse for replies without quoted keys.
+    """
+    length = len(content)
+    index = content.find(key)
+    while index != -1:
+        start = index + len(key)
+        if start < length and content[start] in "：:":
+            start += 1
+            while start < length and content[start].isspace():
+                start += 1
+            end = start
+            while end < length and content[end] not in ",}":
+                end += 1
+            if end > start:
+                return content[start:end].strip()
+        index = content.find(key, index + 1)
+    return None
+
+
+def _normalize_conclusion(conclusion: str) -> str:
+    """Reduce a parsed conclusion to exactly "是" or "否"."""
+    return "是" if conclusion.lstrip(' "\'(（').startswith("是") else "否"
+
 
 @dataclass
 class ReasoningResult:
@@ -24,6 +73,11 @@ class ReasoningResult:
     raw_response: str
     is_valid: bool = True
     error_message: Optional[str] = None
+    
+    def __post_init__(self):
+        # Conclusions and stage names come from a small vocabulary; share one copy of each
+        self.conclusion = sys.intern(self.conclusion)
+        self.current_stage = sys.intern(self.current_stage)
 
 
 @dataclass
@@ -40,9 +94,13 @@ class ReasoningEngine:
     """Handles reasoning and evaluation logic for counselor responses."""
     
     def __init__(self):
-        self.llm_client = get_llm_client()
-        self.prompt_manager = PromptManager()
+        self.prompt_manager = get_prompt_manager()
         self.reasoning_prompts = ReasoningPrompts()
+    
+    @property
+    def llm_client(self):
+        """Current global LLM client, so a reinitialized client is picked up."""
+        return get_llm_client()
         
     def evaluate_response(self, 
                          is_first_session: bool,
@@ -67,6 +125,16 @@ class ReasoningEngine:
         Returns:
             ReasoningResult containing evaluation and suggestions
         """
+        # Revision evaluations depend on the modification history, so only first evaluations are cached
+        use_cache = is_first_evaluation and config.system.CACHE_REASONING_RESULTS
+        if use_cache:
+            cached = reasoning_cache.get(
+                is_first_session, history, counselor_response, upper_round, len(dialogue_history)
+            )
+            if cached is not None:
+                logger.info("🧠 Reusing cached evaluation of counselor response")
+                return cached
+        
         try:
             # Generate appropriate prompt based on session type and evaluation state
             if is_first_evaluation:
@@ -91,15 +159,19 @@ class ReasoningEngine:
             
             # Get reasoning response
             content, reasoning_content = self.llm_client.generate_reasoning(messages)
-            print("\n")
-            print("current content:",content)
-            print("\n")
-            print("reasoning_content:",reasoning_content)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Reasoning content: %s", content)
+                logger.debug("Reasoning chain: %s", reasoning_content)
             # Parse the response
             result = self._parse_reasoning_response(content, reasoning_content)
             
             logger.info(f"Reasoning result: {result.conclusion}, Stage: {result.current_stage}")
             
+            if use_cache and result.is_valid:
+                reasoning_cache.put(
+                    is_first_session, history, counselor_response, upper_round, result, len(dialogue_history)
+                )
+            
             return result
             
         except Exception as e:
@@ -116,43 +188,50 @@ class ReasoningEngine:
     
     def _format_modify_history(self, modify_history: List[ModificationRecord]) -> str:
         """Format modification history for prompt."""
-        if not modify_history:
-            return ""
-        
-        history_items = []
-        for i, record in enumerate(modify_history, 1):
-            history_items.append(f"第{i}次修改请求: {record.improvement_suggestion}")
-        
-        return "; ".join(history_items)
+        return "; ".join(
+            f"第{i}次修改请求: {record.improvement_suggestion}"
+            for i, record in enumerate(modify_history, 1)
+        )
     
     def _parse_reasoning_response(self, content: str, reasoning_content: str) -> ReasoningResult:
         """Parse the reasoning response to extract structured information."""
-        # 分别匹配每个字段，避免相互干扰
+        # 快速路径：回复是合法JSON时直接解析，无需正则
+        parsed = parse_reasoning_reply(content)
+        if parsed is not None:
+            conclusion, improvement_suggestion, current_stage = parsed
+            conclusion = _normalize_conclusion(conclusion)
+            return ReasoningResult(
+                conclusion=conclusion,
+                improvement_suggestion=improvement_suggestion,
+                current_stage=current_stage,
+                reasoning_content=reasoning_content,
+                raw_response=content,
+                is_valid=True
+            )
+        
+        # 分别匹配每个字段，避免相互干扰；字段名不在回复中时跳过对应正则
         
         # 1. 匹配结论
-        conclusion_pattern = r'"结论"\s*:\s*(".*?"|\S+?)(?=\s*[,}])'
-        conclusion_matches = re.findall(conclusion_pattern, content, re.DOTALL)
+        conclusion_matches = _CONCLUSION_RE.findall(content) if "结论" in content else []
         conclusion = "否"  # 默认值
         if conclusion_matches:
-            conclusion = conclusion_matches[0].strip().strip('"')
+            conclusion = _normalize_conclusion(conclusion_matches[0])
         
         # 2. 匹配改进意见 - 停止在下一个字段或结束符号处
-        suggestion_pattern = r'"改进意见"\s*:\s*(".*?"|\S.*?)(?=\s*,\s*"所处阶段"|\s*}|\s*$)'
-        suggestion_matches = re.findall(suggestion_pattern, content, re.DOTALL)
+        suggestion_matches = _SUGGESTION_RE.findall(content) if "改进意见" in content else []
         improvement_suggestion = "需要进一步改进回复内容"  # 默认值
         if suggestion_matches:
             improvement_suggestion = suggestion_matches[0].strip().strip('"')
         
         # 3. 匹配所处阶段
-        stage_pattern = r'"所处阶段"\s*:\s*(".*?"|\S.*?)(?=\s*[,}]|\s*$)'
-        stage_matches = re.findall(stage_pattern, content, re.DOTALL)
+        stage_matches = _STAGE_RE.findall(content) if "所处阶段" in content else []
         current_stage = "未识别"  # 默认值
         if stage_matches:
             current_stage = stage_matches[0].strip().strip('"')
             
-        print("conclusion:", conclusion)
-        print("improvement_suggestion:", improvement_suggestion)
-        print("current_stage:", current_stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed conclusion=%s, suggestion=%s, stage=%s",
+                         conclusion, improvement_suggestion, current_stage)
         
         # 检查是否至少匹配到了结论或改进意见
         if conclusion_matches or suggestion_matches:
@@ -168,26 +247,24 @@ class ReasoningEngine:
             # Fallback: try to extract information more loosely
             logger.warning("Could not parse reasoning response with strict pattern, using fallback")
             
-            # Try to find conclusion
+            # Try to find conclusion: normalize the text right after "结论"
             conclusion = "否"  # Default
-            if "结论" in content:
-                if "是" in content:
-                    conclusion = "是"
+            index = content.find("结论")
+            if index != -1:
+                conclusion = _normalize_conclusion(content[index + len("结论"):].lstrip('"\'：: \t\r\n'))
             
             # Try to find improvement suggestion
             improvement_suggestion = "需要进一步改进回复内容"
-            if "改进意见" in content:
-                # Extract text after "改进意见"
-                suggestion_match = re.search(r'改进意见[：:]\s*([^,}]+)', content, re.DOTALL)
-                if suggestion_match:
-                    improvement_suggestion = suggestion_match.group(1).strip()
+            # Extract text after "改进意见"
+            suggestion = _scan_loose_field(content, "改进意见")
+            if suggestion is not None:
+                improvement_suggestion = suggestion
             
             # Try to find current stage
             current_stage = "未识别"
-            if "所处阶段" in content:
-                stage_match = re.search(r'所处阶段[：:]\s*([^,}]+)', content, re.DOTALL)
-                if stage_match:
-                    current_stage = stage_match.group(1).strip()
+            stage = _scan_loose_field(content, "所处阶段")
+            if stage is not None:
+                current_stage = stage
             
             return ReasoningResult(
                 conclusion=conclusion,
@@ -218,12 +295,12 @@ class ReasoningEngine:
             return False
         
         # Stop if conclusion is positive
-        if "是" in result.conclusion:
+        if result.conclusion == "是":
             logger.info("Reasoning conclusion is positive, stopping modification")
             return False
         
         # Continue if conclusion is negative and we haven't reached max attempts
-        if "否" in result.conclusion and attempt_count < config.system.MAX_MODIFICATION_ATTEMPTS:
+        if result.conclusion == "否" and attempt_count < config.system.MAX_MODIFICATION_ATTEMPTS:
             logger.info(f"Continuing modification (attempt {attempt_count + 1})")
             return True
         
@@ -248,15 +325,12 @@ class ReasoningEngine:
             logger.warning("No modification history provided")
             return ""
         
-        # Format the modification history
-        history_items = []
-        for i, record in enumerate(modify_history, 1):
-            if i == len(modify_history):
-                # Current modification request
-                history_items.append(f"当前修改请求: {record.improvement_suggestion}")
-            else:
-                # Previous modification requests
-                history_items.append(f"第{i}次修改请求: {record.improvement_suggestion}")
+        # Format the modification history: previous requests, then the current one
+        history_items = [
+            f"第{i}次修改请求: {record.improvement_suggestion}"
+            for i, record in enumerate(modify_history[:-1], 1)
+        ]
+        history_items.append(f"当前修改请求: {modify_history[-1].improvement_suggestion}")
         
         # Create the modification prompt
         prompt = (
@@ -340,38 +414,94 @@ class ReasoningEngine:
 
 
 class ReasoningCache:
-    """Cache for reasoning results to avoid redundant computations."""
+    """
+    Cache for reasoning results to avoid redundant computations.
+    
+    Results live in an in-memory LRU; when db_path is given they are also
+    written to a SQLite table so they survive process restarts.
+    """
     
-    def __init__(self, max_size: int = 100):
-        self.cache: Dict[str, ReasoningResult] = {}
+    def __init__(self, max_size: int = 100, db_path: Optional[str] = None):
+        # Ordered least to most recently used
+        self.cache: "OrderedDict[str, ReasoningResult]" = OrderedDict()
         self.max_size = max_size
-        self.access_order: List[str] = []
+        # Shared by concurrently running sessions
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        
+        if db_path:
+            self._open_db(db_path)
+    
+    def _open_db(self, db_path: str):
+        """Open the SQLite store and trim it to the most recent max_size entries."""
+        try:
+            db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS reasoning_cache "
+                "(key TEXT PRIMARY KEY, payload TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            db.execute(
+                "DELETE FROM reasoning_cache WHERE key NOT IN "
+                "(SELECT key FROM reasoning_cache ORDER BY created DESC LIMIT ?)",
+                (self.max_size,)
+            )
+            self._db = db
+            logger.info(f"Reasoning cache persisted to {db_path}")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open reasoning cache database {db_path}: {e}")
+    
+    def _remember(self, key: str, result: ReasoningResult):
+        """Insert into the in-memory LRU; caller holds the lock."""
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        
+        # Remove oldest if cache is full
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
     
     def _generate_key(self, 
                      is_first_session: bool,
                      history: str,
                      counselor_response: str,
-                     upper_round: int) -> str:
+                     upper_round: int,
+                     dialogue_length: int = 0) -> str:
         """Generate a cache key for the reasoning request."""
-        import hashlib
-        
-        key_content = f"{is_first_session}:{upper_round}:{history}:{counselor_response}"
-        return hashlib.md5(key_content.encode()).hexdigest()
+        key_content = f"{is_first_session}:{upper_round}:{dialogue_length}:{history}:{counselor_response}".encode()
+        if HAS_XXHASH:
+            return xxhash.xxh3_128_hexdigest(key_content)
+        return hashlib.blake2b(key_content, digest_size=16).hexdigest()
     
     def get(self, 
             is_first_session: bool,
             history: str,
             counselor_response: str,
-            upper_round: int) -> Optional[ReasoningResult]:
+            upper_round: int,
+            dialogue_length: int = 0) -> Optional[ReasoningResult]:
         """Get cached reasoning result."""
-        key = self._generate_key(is_first_session, history, counselor_response, upper_round)
+        key = self._generate_key(is_first_session, history, counselor_response, upper_round, dialogue_length)
         
-        if key in self.cache:
-            # Move to end of access order
-            self.access_order.remove(key)
-            self.access_order.append(key)
-            logger.debug(f"Cache hit for reasoning request")
-            return self.cache[key]
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                logger.debug(f"Cache hit for reasoning request")
+                return self.cache[key]
+            
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT payload FROM reasoning_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Reasoning cache lookup failed: {e}")
+                    row = None
+                
+                if row is not None:
+                    result = ReasoningResult(**json.loads(row[0]))
+                    self._remember(key, result)
+                    logger.debug(f"Persistent cache hit for reasoning request")
+                    return result
         
         logger.debug(f"Cache miss for reasoning request")
         return None
@@ -381,35 +511,52 @@ class ReasoningCache:
             history: str,
             counselor_response: str,
             upper_round: int,
-            result: ReasoningResult):
+            result: ReasoningResult,
+            dialogue_length: int = 0):
         """Cache reasoning result."""
-        key = self._generate_key(is_first_session, history, counselor_response, upper_round)
-        
-        # Remove oldest if cache is full
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            oldest_key = self.access_order.pop(0)
-            del self.cache[oldest_key]
+        key = self._generate_key(is_first_session, history, counselor_response, upper_round, dialogue_length)
         
-        self.cache[key] = result
-        
-        # Update access order
-        if key in self.access_order:
-            self.access_order.remove(key)
-        self.access_order.append(key)
+        with self._lock:
+            self._remember(key, result)
+            
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO reasoning_cache (key, payload, created) VALUES (?, ?, ?)",
+                        (key, json.dumps(asdict(result), ensure_ascii=False), time.time())
+                    )
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not persist reasoning result: {e}")
         
         logger.debug(f"Cached reasoning result")
     
     def clear(self):
         """Clear all cached results."""
-        self.cache.clear()
-        self.access_order.clear()
+        with self._lock:
+            self.cache.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM reasoning_cache")
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not clear reasoning cache database: {e}")
         logger.info("Reasoning cache cleared")
 
 
 # Global reasoning cache
-reasoning_cache = ReasoningCache()
+reasoning_cache = ReasoningCache(db_path=config.paths.REASONING_CACHE_DB or None)
+
+
+# Global reasoning engine instance (stateless apart from shared prompts), created on first use
+_reasoning_engine: Optional[ReasoningEngine] = None
+_reasoning_engine_lock = threading.Lock()
 
 
 def get_reasoning_engine() -> ReasoningEngine:
-    """Get a reasoning engine instance."""
-    return ReasoningEngine() 
\ No newline at end of file
+    """Get the global reasoning engine instance."""
+    global _reasoning_engine
+    if _reasoning_engine is None:
+        with _reasoning_engine_lock:
+            if _reasoning_engine is None:
+                _reasoning_engine = ReasoningEngine()
+    return _reasoning_engine
+ 
\ No newline at end of file
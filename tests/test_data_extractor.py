@@ -8,10 +8,18 @@ import sys
 import os
 import json
 import tempfile
-import shutil
+from pathlib import Path
 from unittest.mock import Mock, patch, mock_open
 from typing import Dict, List
 
+# Optional fast JSON encoder for fixture files
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
 # Using absolute imports, no path modification needed
 
 from refactored_counseling_system.utils.data_extractor import (
@@ -23,36 +31,101 @@ from refactored_counseling_system.utils.data_extractor import (
     process_counseling_data_folder
 )
 
+# Keep fixture directories in RAM when tmpfs is available and TMPDIR was not set explicitly
+_TMP_ROOT = (
+    "/dev/shm"
+    if not os.environ.get("TMPDIR") and os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK)
+    else None
+)
+
+# UTF-8 needles for checking the plain-text stage output without decoding it
+STAGE_AGENDA_BYTES = "设置议程".encode('utf-8')
+STAGE_NOT_FOUND_BYTES = "[阶段未找到]".encode('utf-8')
+
+# Constant edge-case fixtures, stored as their final JSON text
+EDGE_CASE_BLOBS = {
+    "empty_list.json": b'[]',
+    "malformed_stage.json": r'[["{\"所处阶段_wrong\":\"设置议程\",\"其他信息\":\"测试\"}"]]'.encode('utf-8'),
+    "no_stage.json": r'[["{\"其他信息\":\"测试，没有阶段\"}"]]'.encode('utf-8'),
+    "complex_nesting.json": r'[["{\"所处阶段\":\"设置议程\",\"改进意见\":\"复杂的\\\"嵌套\\\"引号\"}"]]'.encode('utf-8')
+}
+
+
+def _encode_json(data) -> bytes:
+    """Encode a JSON fixture as UTF-8 with 2-space indentation"""
+    if HAS_ORJSON:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _encode_fixtures(fixtures: Dict[str, object]) -> Dict[str, bytes]:
+    """Encode a mapping of fixture file names to JSON data"""
+    return {filename: _encode_json(data) for filename, data in fixtures.items()}
+
+
+def _write_blobs(directory: str, blobs: Dict[str, bytes]) -> None:
+    """Write already-encoded fixture files into an existing directory"""
+    root = Path(directory)
+    for filename, blob in blobs.items():
+        (root / filename).write_bytes(blob)
+
+
+def _remove_tree(path: str) -> None:
+    """Remove a small fixture tree (plain files and directories, no symlinks)"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _remove_tree(entry.path)
+            else:
+                os.unlink(entry.path)
+    os.rmdir(path)
+
+
+def _load_json(path: str):
+    """Read back a JSON file written by the code under test"""
+    if HAS_ORJSON:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 
 class TestStageExtractor(unittest.TestCase):
     """Test cases for StageExtractor class"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.extractor = StageExtractor()
-        self.temp_dir = tempfile.mkdtemp()
+    # Fixture files, encoded once when the module is loaded
+    FIXTURE_BLOBS = _encode_fixtures({
+        "test1.json": [
+            ['{"所处阶段":"设置议程","其他信息":"测试"}'],
+            ['{"所处阶段":"情绪检查","其他信息":"测试"}']
+        ],
+        "test2.json": [
+            ['{"所处阶段":"获取信息","其他信息":"测试"}'],
+            ['{"所处阶段":"问题识别","其他信息":"测试"}'],
+            ['{"所处阶段":"认知模型","其他信息":"测试"}']
+        ],
+        "invalid.json": "not a list"
+    })
+    
+    @classmethod
+    def setUpClass(cls):
+        """Set up read-only test fixtures shared by all tests in the class"""
+        cls.temp_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
+        # Outputs go to a separate directory so they never show up as inputs
+        cls.output_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
         
         # Create test JSON files
-        self.test_data = {
-            "test1.json": [
-                ['{"所处阶段":"设置议程","其他信息":"测试"}'],
-                ['{"所处阶段":"情绪检查","其他信息":"测试"}']
-            ],
-            "test2.json": [
-                ['{"所处阶段":"获取信息","其他信息":"测试"}'],
-                ['{"所处阶段":"问题识别","其他信息":"测试"}'],
-                ['{"所处阶段":"认知模型","其他信息":"测试"}']
-            ],
-            "invalid.json": "not a list"
-        }
-        
-        for filename, data in self.test_data.items():
-            with open(os.path.join(self.temp_dir, filename), 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_blobs(cls.temp_dir, cls.FIXTURE_BLOBS)
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test fixtures"""
-        shutil.rmtree(self.temp_dir)
+        _remove_tree(cls.temp_dir)
+        _remove_tree(cls.output_dir)
+    
+    def setUp(self):
+        """Set up a fresh extractor"""
+        self.extractor = StageExtractor()
     
     def test_extract_stages_from_directory_success(self):
         """Test successful stage extraction"""
@@ -82,54 +155,59 @@ class TestStageExtractor(unittest.TestCase):
             "test.json": ["设置议程", "情绪检查", None]
         }
         
-        json_file = os.path.join(self.temp_dir, "test_stages.json")
-        txt_file = os.path.join(self.temp_dir, "test_stages.txt")
+        json_file = os.path.join(self.output_dir, "test_stages.json")
+        txt_file = os.path.join(self.output_dir, "test_stages.txt")
         
         self.extractor.save_extracted_stages(test_data, json_file, txt_file)
         
         # Check JSON file
         self.assertTrue(os.path.exists(json_file))
-        with open(json_file, 'r', encoding='utf-8') as f:
-            saved_data = json.load(f)
+        saved_data = _load_json(json_file)
         self.assertEqual(saved_data, test_data)
         
         # Check text file
         self.assertTrue(os.path.exists(txt_file))
-        with open(txt_file, 'r', encoding='utf-8') as f:
+        with open(txt_file, 'rb') as f:
             content = f.read()
-        self.assertIn("设置议程", content)
-        self.assertIn("[阶段未找到]", content)
+        self.assertIn(STAGE_AGENDA_BYTES, content)
+        self.assertIn(STAGE_NOT_FOUND_BYTES, content)
 
 
 class TestSuggestionExtractor(unittest.TestCase):
     """Test cases for SuggestionExtractor class"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.extractor = SuggestionExtractor()
-        self.temp_dir = tempfile.mkdtemp()
-        self.output_dir = os.path.join(self.temp_dir, "output")
+    # Fixture files, encoded once when the module is loaded
+    FIXTURE_BLOBS = _encode_fixtures({
+        "test1.json": [
+            ['{"改进意见":"需要更多共情","其他信息":"测试"}'],
+            ['{"改进意见":"语言需要更自然","其他信息":"测试"}']
+        ],
+        "test2.json": [
+            ['{"改进意见":"回应过于正式","其他信息":"测试"}'],
+            ['{"改进意见":"建议使用开放式问题","其他信息":"测试"}'],
+            ['{"改进意见":"需要更多支持性语言","其他信息":"测试"}']
+        ]
+    })
+    
+    @classmethod
+    def setUpClass(cls):
+        """Set up read-only test fixtures shared by all tests in the class"""
+        cls.temp_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
+        cls.work_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
         
         # Create test JSON files
-        self.test_data = {
-            "test1.json": [
-                ['{"改进意见":"需要更多共情","其他信息":"测试"}'],
-                ['{"改进意见":"语言需要更自然","其他信息":"测试"}']
-            ],
-            "test2.json": [
-                ['{"改进意见":"回应过于正式","其他信息":"测试"}'],
-                ['{"改进意见":"建议使用开放式问题","其他信息":"测试"}'],
-                ['{"改进意见":"需要更多支持性语言","其他信息":"测试"}']
-            ]
-        }
-        
-        for filename, data in self.test_data.items():
-            with open(os.path.join(self.temp_dir, filename), 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_blobs(cls.temp_dir, cls.FIXTURE_BLOBS)
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test fixtures"""
-        shutil.rmtree(self.temp_dir)
+        _remove_tree(cls.temp_dir)
+        _remove_tree(cls.work_dir)
+    
+    def setUp(self):
+        """Set up a fresh extractor and a per-test output folder name"""
+        self.extractor = SuggestionExtractor()
+        self.output_dir = f"{self.work_dir}{os.sep}{self._testMethodName}"
     
     def test_extract_suggestions_structured_success(self):
         """Test successful suggestion extraction"""
@@ -145,8 +223,7 @@ class TestSuggestionExtractor(unittest.TestCase):
         self.assertTrue(os.path.exists(test2_output))
         
         # Check extracted content
-        with open(test1_output, 'r', encoding='utf-8') as f:
-            extracted_data = json.load(f)
+        extracted_data = _load_json(test1_output)
         
         self.assertEqual(len(extracted_data), 2)
         self.assertEqual(extracted_data[0], ["需要更多共情"])
@@ -162,38 +239,46 @@ class TestSuggestionExtractor(unittest.TestCase):
 class TestDataExtractor(unittest.TestCase):
     """Test cases for DataExtractor class"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.extractor = DataExtractor()
-        self.temp_dir = tempfile.mkdtemp()
+    # Fixture files, encoded once when the module is loaded
+    FIXTURE_BLOBS = _encode_fixtures({
+        "counseling1.json": [
+            ['{"所处阶段":"设置议程","改进意见":"需要更多共情","其他信息":"测试"}'],
+            ['{"所处阶段":"情绪检查","改进意见":"语言需要更自然","其他信息":"测试"}']
+        ],
+        "counseling2.json": [
+            ['{"所处阶段":"获取信息","改进意见":"回应过于正式","其他信息":"测试"}'],
+            ['{"所处阶段":"问题识别","改进意见":"建议使用开放式问题","其他信息":"测试"}'],
+            ['{"所处阶段":"认知模型","改进意见":"需要更多支持性语言","其他信息":"测试"}']
+        ]
+    })
+    
+    @classmethod
+    def setUpClass(cls):
+        """Set up read-only test fixtures shared by all tests in the class"""
+        cls.temp_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
+        cls.work_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
         
         # Create comprehensive test data
-        self.test_data = {
-            "counseling1.json": [
-                ['{"所处阶段":"设置议程","改进意见":"需要更多共情","其他信息":"测试"}'],
-                ['{"所处阶段":"情绪检查","改进意见":"语言需要更自然","其他信息":"测试"}']
-            ],
-            "counseling2.json": [
-                ['{"所处阶段":"获取信息","改进意见":"回应过于正式","其他信息":"测试"}'],
-                ['{"所处阶段":"问题识别","改进意见":"建议使用开放式问题","其他信息":"测试"}'],
-                ['{"所处阶段":"认知模型","改进意见":"需要更多支持性语言","其他信息":"测试"}']
-            ]
-        }
-        
-        for filename, data in self.test_data.items():
-            with open(os.path.join(self.temp_dir, filename), 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_blobs(cls.temp_dir, cls.FIXTURE_BLOBS)
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test fixtures"""
-        shutil.rmtree(self.temp_dir)
+        _remove_tree(cls.temp_dir)
+        _remove_tree(cls.work_dir)
+    
+    def setUp(self):
+        """Set up a fresh extractor and a per-test output directory"""
+        self.extractor = DataExtractor()
+        self.output_dir = f"{self.work_dir}{os.sep}{self._testMethodName}"
+        os.makedirs(self.output_dir)
     
     def test_extract_stages_from_directory(self):
         """Test stage extraction through DataExtractor"""
         stages_data, errors = self.extractor.extract_stages_from_directory(
             self.temp_dir,
-            os.path.join(self.temp_dir, "stages.json"),
-            os.path.join(self.temp_dir, "stages.txt")
+            os.path.join(self.output_dir, "stages.json"),
+            os.path.join(self.output_dir, "stages.txt")
         )
         
         self.assertIsNotNone(stages_data)
@@ -202,12 +287,12 @@ class TestDataExtractor(unittest.TestCase):
         self.assertIn("counseling2.json", stages_data)
         
         # Check files were created
-        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "stages.json")))
-        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "stages.txt")))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "stages.json")))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "stages.txt")))
     
     def test_extract_suggestions_from_directory(self):
         """Test suggestion extraction through DataExtractor"""
-        output_dir = os.path.join(self.temp_dir, "suggestions")
+        output_dir = os.path.join(self.output_dir, "suggestions")
         failed_files = self.extractor.extract_suggestions_from_directory(self.temp_dir, output_dir)
         
         self.assertEqual(len(failed_files), 0)
@@ -238,22 +323,28 @@ class TestDataExtractor(unittest.TestCase):
 class TestUtilityFunctions(unittest.TestCase):
     """Test cases for utility functions"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.temp_dir = tempfile.mkdtemp()
-        
-        # Create test data
-        test_data = [
+    # Fixture files, encoded once when the module is loaded
+    FIXTURE_BLOBS = _encode_fixtures({
+        "test.json": [
             ['{"所处阶段":"设置议程","改进意见":"需要更多共情"}'],
             ['{"所处阶段":"情绪检查","改进意见":"语言需要更自然"}']
         ]
+    })
+    
+    @classmethod
+    def setUpClass(cls):
+        """Set up read-only test fixtures shared by all tests in the class"""
+        cls.temp_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
+        cls.work_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
         
-        with open(os.path.join(self.temp_dir, "test.json"), 'w', encoding='utf-8') as f:
-            json.dump(test_data, f, ensure_ascii=False, indent=2)
+        # Create test data
+        _write_blobs(cls.temp_dir, cls.FIXTURE_BLOBS)
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test fixtures"""
-        shutil.rmtree(self.temp_dir)
+        _remove_tree(cls.temp_dir)
+        _remove_tree(cls.work_dir)
     
     def test_extract_stages_from_folder(self):
         """Test extract_stages_from_folder utility function"""
@@ -265,7 +356,7 @@ class TestUtilityFunctions(unittest.TestCase):
     
     def test_extract_suggestions_from_folder(self):
         """Test extract_suggestions_from_folder utility function"""
-        output_dir = os.path.join(self.temp_dir, "suggestions")
+        output_dir = os.path.join(self.work_dir, f"suggestions_{self._testMethodName}")
         failed_files = extract_suggestions_from_folder(self.temp_dir, output_dir)
         
         self.assertEqual(len(failed_files), 0)
@@ -284,36 +375,25 @@ class TestUtilityFunctions(unittest.TestCase):
 class TestEdgeCases(unittest.TestCase):
     """Test edge cases and error conditions"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.temp_dir = tempfile.mkdtemp()
+    @classmethod
+    def setUpClass(cls):
+        """Set up read-only test fixtures shared by all tests in the class"""
+        cls.temp_dir = tempfile.mkdtemp(dir=_TMP_ROOT)
         
         # Create edge case test data
-        edge_cases = {
-            "empty_list.json": [],
-            "malformed_stage.json": [
-                ['{"所处阶段_wrong":"设置议程","其他信息":"测试"}']
-            ],
-            "no_stage.json": [
-                ['{"其他信息":"测试，没有阶段"}']
-            ],
-            "complex_nesting.json": [
-                ['{"所处阶段":"设置议程","改进意见":"复杂的\\"嵌套\\"引号"}']
-            ]
-        }
+        _write_blobs(cls.temp_dir, EDGE_CASE_BLOBS)
         
-        for filename, data in edge_cases.items():
-            with open(os.path.join(self.temp_dir, filename), 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        # Every test inspects a different file of the same extraction, so run it once
+        cls.stages_data, cls.errors = DataExtractor().extract_stages_from_directory(cls.temp_dir)
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test fixtures"""
-        shutil.rmtree(self.temp_dir)
+        _remove_tree(cls.temp_dir)
     
     def test_handle_empty_files(self):
         """Test handling of empty files"""
-        extractor = DataExtractor()
-        stages_data, errors = extractor.extract_stages_from_directory(self.temp_dir)
+        stages_data = self.stages_data
         
         self.assertIsNotNone(stages_data)
         self.assertIn("empty_list.json", stages_data)
@@ -321,8 +401,7 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_handle_malformed_data(self):
         """Test handling of malformed stage data"""
-        extractor = DataExtractor()
-        stages_data, errors = extractor.extract_stages_from_directory(self.temp_dir)
+        stages_data = self.stages_data
         
         self.assertIsNotNone(stages_data)
         self.assertIn("malformed_stage.json", stages_data)
@@ -330,8 +409,7 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_handle_missing_stages(self):
         """Test handling of missing stage information"""
-        extractor = DataExtractor()
-        stages_data, errors = extractor.extract_stages_from_directory(self.temp_dir)
+        stages_data = self.stages_data
         
         self.assertIsNotNone(stages_data)
         self.assertIn("no_stage.json", stages_data)
@@ -339,8 +417,7 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_handle_complex_nesting(self):
         """Test handling of complex nested quotes"""
-        extractor = DataExtractor()
-        stages_data, errors = extractor.extract_stages_from_directory(self.temp_dir)
+        stages_data = self.stages_data
         
         self.assertIsNotNone(stages_data)
         self.assertIn("complex_nesting.json", stages_data)
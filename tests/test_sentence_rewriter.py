@@ -1,17 +1,23 @@
 """
 Comprehensive test suite for the sentence_rewriter module.
 Tests sentence rewriting functionality, integration with the counseling system, and performance.
+
+Performance tests are skipped by default; run them with
+RUN_PERF=1 python -m unittest refactored_counseling_system.tests.test_sentence_rewriter
 """
 
 import unittest
 import sys
 import os
+import gc
 from unittest.mock import Mock, patch
 import time
+from types import SimpleNamespace
 from typing import List, Dict
 
 # Using absolute imports, no path modification needed
 
+from refactored_counseling_system.utils import sentence_rewriter
 from refactored_counseling_system.utils.sentence_rewriter import (
     SentenceRewriter,
     CounselorResponseEnhancer,
@@ -24,10 +30,10 @@ from refactored_counseling_system.utils.sentence_rewriter import (
 class TestSentenceRewriter(unittest.TestCase):
     """Test cases for SentenceRewriter class"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.rewriter = SentenceRewriter()
-        self.test_sentences = [
+    @classmethod
+    def setUpClass(cls):
+        """Set up the sentence fixtures shared by the class"""
+        cls.test_sentences = [
             "请您详细描述一下您的症状。",
             "我们需要对您的情况进行全面评估。",
             "根据您的描述，我认为您可能存在焦虑症状。",
@@ -35,7 +41,7 @@ class TestSentenceRewriter(unittest.TestCase):
             "今天我们可以先聊聊你现在的感受，看看是什么让你最近觉得迷茫。"
         ]
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_rewrite_sentence_basic(self, mock_get_client):
         """Test basic sentence rewriting"""
         # Mock the LLM client
@@ -43,15 +49,17 @@ class TestSentenceRewriter(unittest.TestCase):
         mock_client.generate_conversation_response.return_value = "你能跟我说说你的症状吗？"
         mock_get_client.return_value = mock_client
         
+        rewriter = SentenceRewriter()
+        
         # Test sentence rewriting
         original = "请您详细描述一下您的症状。"
-        result = self.rewriter.rewrite_sentence(original)
+        result = rewriter.rewrite_sentence(original)
         
         self.assertIsInstance(result, str)
         self.assertNotEqual(result, original)
         self.assertTrue(len(result) > 0)
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_rewrite_with_context(self, mock_get_client):
         """Test context-aware sentence rewriting"""
         # Mock the LLM client
@@ -59,16 +67,18 @@ class TestSentenceRewriter(unittest.TestCase):
         mock_client.generate_conversation_response.return_value = "你现在心情怎么样？"
         mock_get_client.return_value = mock_client
         
+        rewriter = SentenceRewriter()
+        
         # Test with context
         original = "请您描述一下您的情绪状态。"
         context = "CBT咨询的情绪检查阶段，需要温和地了解来访者的情绪状态"
-        result = self.rewriter.rewrite_with_context(original, context)
+        result = rewriter.rewrite_with_context(original, context)
         
         self.assertIsInstance(result, str)
         self.assertNotEqual(result, original)
         self.assertTrue(len(result) > 0)
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_rewrite_multiple_sentences(self, mock_get_client):
         """Test batch sentence rewriting"""
         # Mock the LLM client
@@ -82,8 +92,10 @@ class TestSentenceRewriter(unittest.TestCase):
         ]
         mock_get_client.return_value = mock_client
         
+        rewriter = SentenceRewriter()
+        
         # Test batch rewriting
-        results = self.rewriter.rewrite_multiple_sentences(self.test_sentences)
+        results = rewriter.rewrite_multiple_sentences(self.test_sentences)
         
         self.assertEqual(len(results), len(self.test_sentences))
         for i, result in enumerate(results):
@@ -92,7 +104,7 @@ class TestSentenceRewriter(unittest.TestCase):
             self.assertEqual(result['original'], self.test_sentences[i])
             self.assertNotEqual(result['rewritten'], self.test_sentences[i])
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_rewrite_cbt_stage_sentences(self, mock_get_client):
         """Test CBT stage-specific sentence rewriting"""
         # Mock the LLM client
@@ -100,9 +112,11 @@ class TestSentenceRewriter(unittest.TestCase):
         mock_client.generate_conversation_response.return_value = "你现在心情怎么样？"
         mock_get_client.return_value = mock_client
         
+        rewriter = SentenceRewriter()
+        
         # Test CBT stage rewriting
         sentences = ["请您描述一下您的情绪状态。", "您感觉如何？"]
-        results = self.rewriter.rewrite_cbt_stage_sentences(sentences, "情绪检查")
+        results = rewriter.rewrite_cbt_stage_sentences(sentences, "情绪检查")
         
         self.assertEqual(len(results), 2)
         for result in results:
@@ -111,7 +125,7 @@ class TestSentenceRewriter(unittest.TestCase):
             self.assertIn('context', result)
             self.assertIn('情绪检查', result['context'])
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_enhance_counselor_response(self, mock_get_client):
         """Test counselor response enhancement"""
         # Mock the LLM client
@@ -119,15 +133,17 @@ class TestSentenceRewriter(unittest.TestCase):
         mock_client.generate_conversation_response.return_value = "我们来谈谈你的感受吧。"
         mock_get_client.return_value = mock_client
         
+        rewriter = SentenceRewriter()
+        
         # Test response enhancement
         original = "我们需要讨论您的情感问题。"
-        result = self.rewriter.enhance_counselor_response(original, "情绪检查")
+        result = rewriter.enhance_counselor_response(original, "情绪检查")
         
         self.assertIsInstance(result, str)
         self.assertNotEqual(result, original)
         self.assertTrue(len(result) > 0)
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_error_handling(self, mock_get_client):
         """Test error handling in sentence rewriting"""
         # Mock the LLM client to raise an exception
@@ -135,22 +151,62 @@ class TestSentenceRewriter(unittest.TestCase):
         mock_client.generate_conversation_response.side_effect = Exception("API Error")
         mock_get_client.return_value = mock_client
         
+        rewriter = SentenceRewriter()
+        
         # Test error handling
         original = "请您详细描述一下您的症状。"
-        result = self.rewriter.rewrite_sentence(original)
+        result = rewriter.rewrite_sentence(original)
         
         # Should return original sentence on error
         self.assertEqual(result, original)
+    
+    @patch.object(sentence_rewriter, 'get_llm_client')
+    def test_rewrite_results_are_cached(self, mock_get_client):
+        """Test that repeated rewrites reuse the cached result"""
+        # Mock the LLM client
+        mock_client = Mock()
+        mock_client.generate_conversation_response.side_effect = ["第一次改写", "第二次改写"]
+        mock_get_client.return_value = mock_client
+        
+        # Fresh rewriter so it picks up the mocked client and starts with an empty cache
+        rewriter = SentenceRewriter()
+        original = "请您描述一下您的情绪状态。"
+        
+        first = rewriter.rewrite_with_context(original, "情绪检查")
+        second = rewriter.rewrite_with_context(original, "情绪检查")
+        self.assertEqual(first, "第一次改写")
+        self.assertEqual(second, first)
+        self.assertEqual(mock_client.generate_conversation_response.call_count, 1)
+        
+        # High temperatures ask for variety and bypass the cache
+        third = rewriter.rewrite_with_context(original, "情绪检查", temperature=1.0)
+        self.assertEqual(third, "第二次改写")
+        self.assertEqual(mock_client.generate_conversation_response.call_count, 2)
+
+
+    @patch.object(sentence_rewriter, 'get_llm_client')
+    def test_custom_prompt_template(self, mock_get_client):
+        """Test that an assigned template is filled like str.format, in any placeholder order"""
+        # Mock the LLM client
+        mock_client = Mock()
+        mock_client.generate_conversation_response.return_value = "你现在心情怎么样？"
+        mock_get_client.return_value = mock_client
+        
+        rewriter = SentenceRewriter()
+        rewriter.rewrite_prompt = "句子：{sentence}\n上下文：{context}\n再次确认：{sentence} {{保留括号}}"
+        rewriter.rewrite_with_context("请您描述一下您的情绪状态。", "情绪检查")
+        
+        messages = mock_client.generate_conversation_response.call_args[0][0]
+        self.assertEqual(
+            messages[-1]['content'],
+            "句子：请您描述一下您的情绪状态。\n上下文：情绪检查\n再次确认：请您描述一下您的情绪状态。 {保留括号}"
+        )
 
 
 class TestCounselorResponseEnhancer(unittest.TestCase):
     """Test cases for CounselorResponseEnhancer class"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.enhancer = CounselorResponseEnhancer()
-    
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_enhance_response(self, mock_get_client):
         """Test response enhancement with context"""
         # Mock the LLM client
@@ -158,6 +214,8 @@ class TestCounselorResponseEnhancer(unittest.TestCase):
         mock_client.generate_conversation_response.return_value = "你现在感觉怎么样？"
         mock_get_client.return_value = mock_client
         
+        enhancer = CounselorResponseEnhancer()
+        
         # Test response enhancement
         original = "请描述您的情绪状态。"
         context = {
@@ -165,13 +223,13 @@ class TestCounselorResponseEnhancer(unittest.TestCase):
             'patient_emotion': '焦虑',
             'session_type': '首次会话'
         }
-        result = self.enhancer.enhance_response(original, context)
+        result = enhancer.enhance_response(original, context)
         
         self.assertIsInstance(result, str)
         self.assertNotEqual(result, original)
         self.assertTrue(len(result) > 0)
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_enhance_multiple_responses(self, mock_get_client):
         """Test batch response enhancement"""
         # Mock the LLM client
@@ -182,10 +240,12 @@ class TestCounselorResponseEnhancer(unittest.TestCase):
         ]
         mock_get_client.return_value = mock_client
         
+        enhancer = CounselorResponseEnhancer()
+        
         # Test batch enhancement
         responses = ["请描述您的情绪状态。", "我们需要了解您的情况。"]
         context = {'current_stage': '情绪检查'}
-        results = self.enhancer.enhance_multiple_responses(responses, context)
+        results = enhancer.enhance_multiple_responses(responses, context)
         
         self.assertEqual(len(results), 2)
         for result in results:
@@ -196,7 +256,17 @@ class TestCounselorResponseEnhancer(unittest.TestCase):
 class TestUtilityFunctions(unittest.TestCase):
     """Test cases for utility functions"""
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    def setUp(self):
+        """Drop the shared helper instances so each test builds them with its own mock client"""
+        sentence_rewriter._default_rewriter.cache_clear()
+        sentence_rewriter._default_enhancer.cache_clear()
+    
+    def tearDown(self):
+        """Do not leak instances holding a mock client into other tests"""
+        sentence_rewriter._default_rewriter.cache_clear()
+        sentence_rewriter._default_enhancer.cache_clear()
+    
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_quick_rewrite(self, mock_get_client):
         """Test quick_rewrite function"""
         # Mock the LLM client
@@ -211,7 +281,20 @@ class TestUtilityFunctions(unittest.TestCase):
         self.assertIsInstance(result, str)
         self.assertNotEqual(result, original)
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
+    def test_quick_rewrite_reuses_rewriter(self, mock_get_client):
+        """quick_rewrite builds its rewriter once and reuses it across calls"""
+        mock_client = Mock()
+        mock_client.generate_conversation_response.side_effect = ["你能说说吗？", "你觉得呢？"]
+        mock_get_client.return_value = mock_client
+        
+        quick_rewrite("请您详细描述一下。")
+        quick_rewrite("请问您的看法是什么？")
+        
+        mock_get_client.assert_called_once()
+        self.assertEqual(mock_client.generate_conversation_response.call_count, 2)
+    
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_quick_enhance_counselor_response(self, mock_get_client):
         """Test quick_enhance_counselor_response function"""
         # Mock the LLM client
@@ -226,7 +309,7 @@ class TestUtilityFunctions(unittest.TestCase):
         self.assertIsInstance(result, str)
         self.assertNotEqual(result, original)
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_integrate_with_counselor_agent(self, mock_get_client):
         """Test integration with counselor agent"""
         # Mock the LLM client
@@ -250,34 +333,47 @@ class TestUtilityFunctions(unittest.TestCase):
 class TestPerformance(unittest.TestCase):
     """Performance tests for sentence rewriter"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.rewriter = SentenceRewriter()
-        self.large_sentence_list = [
+    @classmethod
+    def setUpClass(cls):
+        """Build the immutable sentence fixtures once for the class"""
+        cls.large_sentence_list = tuple(
             f"这是第{i}个测试句子，用于测试批量处理性能。" for i in range(100)
-        ]
+        )
+        cls.rewritten_sentence_list = tuple(
+            f"这是第{i}个改写句子。" for i in range(100)
+        )
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @unittest.skipUnless(os.environ.get("RUN_PERF"), "perf tests skipped (set RUN_PERF=1 to run)")
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_batch_processing_performance(self, mock_get_client):
         """Test performance of batch processing"""
-        # Mock the LLM client
-        mock_client = Mock()
-        mock_client.generate_conversation_response.side_effect = [
-            f"这是第{i}个改写句子。" for i in range(100)
-        ]
-        mock_get_client.return_value = mock_client
+        # Stub the LLM client with a plain callable so mock call bookkeeping
+        # does not dominate the timed region
+        rewritten_sentences = iter(self.rewritten_sentence_list)
+        stub_client = SimpleNamespace(
+            generate_conversation_response=lambda *args, **kwargs: next(rewritten_sentences)
+        )
+        mock_get_client.return_value = stub_client
+        
+        # Build the rewriter under the patch so it uses the stub client
+        rewriter = SentenceRewriter()
         
-        # Time the batch processing
-        start_time = time.time()
-        results = self.rewriter.rewrite_multiple_sentences(self.large_sentence_list[:10])  # Test with 10 sentences
-        end_time = time.time()
+        # Time the batch processing; keep GC pauses out of the measurement
+        gc.disable()
+        try:
+            start_time = time.perf_counter()
+            results = rewriter.rewrite_multiple_sentences(list(self.large_sentence_list[:10]))  # Test with 10 sentences
+            end_time = time.perf_counter()
+        finally:
+            gc.enable()
         
-        # Check results
+        # Check results; every rewrite must have come from the stub
         self.assertEqual(len(results), 10)
+        self.assertCountEqual([result['rewritten'] for result in results], self.rewritten_sentence_list[:10])
         processing_time = end_time - start_time
         
-        # Should complete in reasonable time (adjust threshold as needed)
-        self.assertLess(processing_time, 30.0)  # 30 seconds threshold
+        # With the LLM stubbed out this only measures orchestration overhead
+        self.assertLess(processing_time, 1.0)  # 1 second threshold
         
         print(f"Batch processing of 10 sentences took {processing_time:.2f} seconds")
 
@@ -285,29 +381,41 @@ class TestPerformance(unittest.TestCase):
 class TestIntegration(unittest.TestCase):
     """Integration tests with the counseling system"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.rewriter = SentenceRewriter()
-        self.enhancer = CounselorResponseEnhancer()
-    
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_integration_with_cbt_stages(self, mock_get_client):
         """Test integration with CBT stages"""
-        # Mock the LLM client
+        # Test different CBT stages, each with the wording its context uses for the stage
+        stage_keywords = {
+            "设置议程": "议程设置",
+            "情绪检查": "情绪检查",
+            "获取信息": "信息收集",
+            "讨论诊断": "诊断讨论",
+            "问题识别": "问题识别",
+            "认知模型": "认知模型",
+            "行为激活": "行为激活",
+            "总结作业": "总结布置作业"
+        }
+        test_sentence = "我们需要进行下一步的工作。"
+        
+        # Mock the LLM client with one canned reply per stage, picked by the stage's context in the prompt
+        responses = {stage: f"{stage}：你现在心情怎么样？" for stage in stage_keywords}
         mock_client = Mock()
-        mock_client.generate_conversation_response.return_value = "你现在心情怎么样？"
+        mock_client.generate_conversation_response.side_effect = lambda messages, **kwargs: next(
+            reply for stage, reply in responses.items() if stage_keywords[stage] in messages[-1]['content']
+        )
         mock_get_client.return_value = mock_client
         
-        # Test different CBT stages
-        stages = ["设置议程", "情绪检查", "获取信息", "讨论诊断", "问题识别", "认知模型", "行为激活", "总结作业"]
-        test_sentence = "我们需要进行下一步的工作。"
+        # Build the rewriter under the patch so it uses the mocked client
+        rewriter = SentenceRewriter()
         
-        for stage in stages:
-            result = self.rewriter.rewrite_cbt_stage_sentences([test_sentence], stage)
-            self.assertEqual(len(result), 1)
-            self.assertIn(stage, result[0]['context'])
+        for stage, keyword in stage_keywords.items():
+            with self.subTest(stage=stage):
+                result = rewriter.rewrite_cbt_stage_sentences([test_sentence], stage)
+                self.assertEqual(len(result), 1)
+                self.assertEqual(result[0]['rewritten'], responses[stage])
+                self.assertIn(keyword, result[0]['context'])
     
-    @patch('refactored_counseling_system.utils.sentence_rewriter.get_llm_client')
+    @patch.object(sentence_rewriter, 'get_llm_client')
     def test_integration_with_dialogue_context(self, mock_get_client):
         """Test integration with dialogue context"""
         # Mock the LLM client
@@ -324,8 +432,11 @@ class TestIntegration(unittest.TestCase):
         
         original = "请描述您的情况。"
         
+        # Build the enhancer under the patch so it uses the mocked client
+        enhancer = CounselorResponseEnhancer()
+        
         for context in contexts:
-            result = self.enhancer.enhance_response(original, context)
+            result = enhancer.enhance_response(original, context)
             self.assertIsInstance(result, str)
             self.assertNotEqual(result, original)
 
@@ -334,7 +445,7 @@ class TestEdgeCases(unittest.TestCase):
     """Test edge cases and error conditions"""
     
     def setUp(self):
-        """Set up test fixtures"""
+        """Set up test fixtures; a fresh rewriter starts with an empty result cache"""
         self.rewriter = SentenceRewriter()
     
     def test_empty_string_input(self):
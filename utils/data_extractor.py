@@ -7,18 +7,446 @@ import os
 import json
 import re
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+import mmap
+from bisect import bisect_right
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple, Any
 from pathlib import Path
 
+# 可选的高速JSON解析库
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
+# 可选的流式JSON解析库，用于超大文件
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+    ijson = None
+
+# 可选的RE2正则引擎（google-re2），保证线性时间匹配
+try:
+    import re2
+    HAS_RE2 = True
+except ImportError:
+    HAS_RE2 = False
+    re2 = None
+
 logger = logging.getLogger(__name__)
 
 
+def _compile_linear(pattern: str):
+    """优先使用RE2编译正则（匹配时间与输入长度成线性关系），不可用时退回标准re模块"""
+    if HAS_RE2:
+        try:
+            return re2.compile(pattern)
+        except Exception as e:
+            logger.debug(f"RE2无法编译 {pattern!r}，改用re: {e}")
+    return re.compile(pattern)
+
+
+# 定位"所处阶段"并直接捕获清洗后的内容（只看同一行）：
+# 跳过开头的 '":"' / '\\":\\"' 等符号，并排除结尾的 '"}' / '\\"}' 等符号
+# 依赖re中\s匹配Unicode空白的语义（RE2的\s只匹配ASCII空白），因此不交给RE2
+_STAGE_RE = re.compile(r'所处阶段(?:[":\\]|[^\S\n])*(?P<stage>.*?)["\\}\s]*$', re.MULTILINE)
+
+# 用于找到"改进意见"键值的正则表达式
+# 采用"展开循环"写法：普通字符整段匹配，只在转义字符处进入分组，两部分互不重叠，不会产生回溯
+# 该正则作用于模型生成的任意文本，安装了RE2时交给RE2执行
+_SUGGESTION_RE = _compile_linear(r'"改进意见":"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+# 连接各项文本时使用的分隔符（换行、反斜杠、换行）：上面的建议正则既不能跨越它匹配，
+# 也不能从它开始匹配，因此对连接后的文本扫描一次，结果与逐项调用findall完全相同
+_ITEM_SEPARATOR = "\n\\\n"
+# 流式解析时每攒够这么多回合扫描一次，限制同时驻留内存的文本量
+_SCAN_BATCH_TURNS = 1024
+
+# 安装了ijson时，不小于该大小的文件按元素流式解析，避免整个文件的对象树同时驻留内存
+_STREAM_MIN_BYTES = 32 * 1024 * 1024
+
+# 安装了orjson时，不小于该大小的文件通过mmap交给orjson解析，省去read()产生的整份字节拷贝
+_MMAP_MIN_BYTES = 1024 * 1024
+
+# 解析JSON时可能抛出的格式错误（orjson的错误类型是json.JSONDecodeError的子类）
+_JSON_DECODE_ERRORS = (json.JSONDecodeError, ijson.JSONError) if HAS_IJSON else (json.JSONDecodeError,)
+
+# 阶段提取中回合级问题的说明；问题按文件汇总，每个文件每类问题只输出一条日志
+_STAGE_NOT_FOUND = "未找到 '所处阶段'"
+_STAGE_NOT_STR = "末尾项不是字符串"
+_STAGE_BAD_TURN = "内容为空或格式不正确"
+# 汇总日志中每类问题最多列出的回合序号数
+_LOGGED_TURNS_LIMIT = 20
+
+# 指定了多个进程时，文件数达到该值才真正使用进程池，小目录不值得承担子进程的启动开销
+_PARALLEL_MIN_FILES = 16
+# 每个子进程一次领取的文件数，用于摊薄进程间通信开销
+_PARALLEL_CHUNKSIZE = 8
+
+
+def _map_files(func: Callable, max_workers: Optional[int], *iterables) -> List[Any]:
+    """
+    对每个文件调用func；指定了max_workers（大于1）且文件较多时分发到进程池并行处理
+    
+    max_workers为None时在当前进程中依次处理。结果顺序与输入一致。
+    func必须是模块级函数，以便子进程按名称导入。
+    """
+    file_count = len(iterables[0])
+    workers = min(max_workers or 1, file_count)
+    if file_count < _PARALLEL_MIN_FILES or workers < 2:
+        return list(map(func, *iterables))
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, *iterables, chunksize=_PARALLEL_CHUNKSIZE))
+
+
+def _scan_json_files(directory: str) -> Tuple[List[str], List[str]]:
+    """
+    列出目录中的JSON文件（跳过子目录），按文件名排序
+    
+    类型判断使用scandir已缓存的信息，路径直接取自DirEntry而不再逐个拼接。
+    
+    Returns:
+        (文件名列表, 对应的文件路径列表)
+    """
+    with os.scandir(directory) as entries:
+        files = sorted(
+            (entry.name, entry.path) for entry in entries
+            if entry.name.endswith('.json') and entry.is_file()
+        )
+    return [name for name, _ in files], [path for _, path in files]
+
+
+def _load_json_file(file_path: str) -> Any:
+    """读取JSON文件；安装了orjson时直接解析原始字节，较大的文件映射到内存后解析"""
+    if HAS_ORJSON:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < _MMAP_MIN_BYTES:
+                return orjson.loads(f.read())
+            
+            # 提示内核按顺序预读
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                return orjson.loads(view)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _dump_json_file(data: Any, file_path: str) -> None:
+    """
+    写入JSON文件（中文原样输出，2空格缩进，末尾带换行）
+    
+    安装了orjson时在C层一次完成编码和缩进；两条路径的输出逐字节相同，与是否安装orjson无关。
+    """
+    if HAS_ORJSON:
+        with open(file_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+        return
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def _starts_with_list(f: BinaryIO) -> bool:
+    """检查JSON文件的第一个非空白字节是否为'['，检查后回到文件开头"""
+    is_list = False
+    while True:
+        chunk = f.read(4096)
+        if not chunk:
+            break
+        chunk = chunk.lstrip()
+        if chunk:
+            is_list = chunk.startswith(b'[')
+            break
+    f.seek(0)
+    return is_list
+
+
+@contextmanager
+def _open_json_items(file_path: str):
+    """
+    打开JSON文件并提供其顶层内容
+    
+    大文件（安装了ijson且顶层为列表时）提供逐个解析列表元素的迭代器，
+    内存占用与单个回合而不是整个文件成正比；其余情况提供整体解析的结果。
+    """
+    if HAS_IJSON and os.path.getsize(file_path) >= _STREAM_MIN_BYTES:
+        with open(file_path, 'rb') as f:
+            if _starts_with_list(f):
+                yield ijson.items(f, 'item')
+                return
+    yield _load_json_file(file_path)
+
+
+def _batched(items: Iterable, size: int) -> Iterator:
+    """把可迭代对象按size个元素一组切分成列表"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _iter_turn_batches(data: Any) -> Iterable[List[Any]]:
+    """整体解析的文件作为一批；流式解析时data是列表元素的迭代器，按批切分"""
+    if isinstance(data, list):
+        return [data]
+    return _batched(data, _SCAN_BATCH_TURNS)
+
+
+def _scan_stages(turns: List[Any], first_turn: int, problems: Dict[str, List[int]]) -> List[Optional[str]]:
+    """
+    提取一批回合中每个回合的"所处阶段"，未找到阶段的回合为None
+    
+    出现问题的回合序号（从first_turn开始计数）按问题类型记入problems，
+    由调用方在文件处理完后通过_log_stage_problems统一输出。
+    """
+    stages = []
+    # 遍历每一个内部列表（代表一个对话回合）
+    for turn_count, turn_list in enumerate(turns, first_turn):
+        stage = None  # 默认值为None，确保即使提取失败也占位
+        
+        # 解析器（json/orjson/ijson）只产生内置的list和str，直接比较类型即可，不必走isinstance
+        if type(turn_list) is list and turn_list:
+            last_item_str = turn_list[0]
+            
+            if type(last_item_str) is str:
+                match = _STAGE_RE.search(last_item_str)
+                if match:
+                    stage = match.group('stage').strip()
+                else:
+                    problems.setdefault(_STAGE_NOT_FOUND, []).append(turn_count)
+            else:
+                problems.setdefault(_STAGE_NOT_STR, []).append(turn_count)
+        else:
+            problems.setdefault(_STAGE_BAD_TURN, []).append(turn_count)
+        
+        stages.append(stage)
+    return stages
+
+
+def _log_stage_problems(filename: str, problems: Dict[str, List[int]]) -> None:
+    """每类问题输出一条警告，列出出现问题的回合数和前若干个回合序号"""
+    if not problems or not logger.isEnabledFor(logging.WARNING):
+        return
+    
+    for problem, turns in problems.items():
+        shown = ", ".join(str(turn) for turn in turns[:_LOGGED_TURNS_LIMIT])
+        if len(turns) > _LOGGED_TURNS_LIMIT:
+            shown += ", ..."
+        logger.warning(f"文件 '{filename}', {len(turns)} 个回合{problem}（回合 {shown}）")
+
+
+def _scan_suggestions(inner_lists: List[Any]) -> List[List[str]]:
+    """
+    提取一批回合中每一项的"改进意见"，返回与输入结构相同的嵌套列表
+    
+    所有项连接成一段文本后只做一次正则扫描，再按偏移量把匹配结果归还给各项。
+    非字符串项视为不包含建议。
+    """
+    items = [item if isinstance(item, str) else "" for inner_list in inner_lists for item in inner_list]
+    found: List[List[str]] = [[] for _ in items]
+    
+    text = _ITEM_SEPARATOR.join(items)
+    # 大多数文本不包含该键，先用子串检查跳过正则扫描
+    if '"改进意见"' in text:
+        item_starts = []
+        offset = 0
+        for item in items:
+            item_starts.append(offset)
+            offset += len(item) + len(_ITEM_SEPARATOR)
+        
+        for match in _SUGGESTION_RE.finditer(text):
+            found[bisect_right(item_starts, match.start()) - 1].append(match.group(1))
+    
+    # 同一项中有多个匹配时（字符串格式不正确）连接起来以保留所有信息；
+    # 没有找到建议时添加占位符以保持长度一致
+    suggestions = iter([" | ".join(matches) if matches else "未找到改进意见" for matches in found])
+    return [[next(suggestions) for _ in inner_list] for inner_list in inner_lists]
+
+
+def _scan_file(file_path: str, want_stages: bool,
+               want_suggestions: bool) -> Tuple[Optional[List[Optional[str]]], Optional[Tuple[List[int], List[List[str]]]]]:
+    """
+    只解析一次JSON文件，按需提取"所处阶段"和"改进意见"（解析错误向上抛出）
+    
+    Args:
+        file_path: JSON文件路径
+        want_stages: 是否提取阶段
+        want_suggestions: 是否提取建议
+        
+    Returns:
+        (阶段列表, (原始内层列表长度, 建议列表))；未请求或无法提取的部分为None
+    """
+    filename = os.path.basename(file_path)
+    file_stages: Optional[List[Optional[str]]] = [] if want_stages else None
+    turn_count = 0
+    problems: Dict[str, List[int]] = {}
+    original_inner_lens: List[int] = []
+    suggestions_data: List[List[str]] = []
+    suggestions_ok = want_suggestions
+    
+    with _open_json_items(file_path) as data:
+        # 流式解析时data是列表元素的迭代器
+        if file_stages is not None and not isinstance(data, (list, Iterator)):
+            logger.warning(f"文件 '{filename}' 的顶层内容不是列表，已跳过阶段提取")
+            file_stages = None
+        
+        if file_stages is not None or suggestions_ok:
+            for batch in _iter_turn_batches(data):
+                if file_stages is not None:
+                    file_stages.extend(_scan_stages(batch, turn_count + 1, problems))
+                turn_count += len(batch)
+                
+                # 回合结构不符合建议提取要求时只跳过建议输出，阶段照常提取
+                if suggestions_ok:
+                    try:
+                        original_inner_lens.extend(len(original_inner_list) for original_inner_list in batch)
+                        suggestions_data.extend(_scan_suggestions(batch))
+                    except Exception as e:
+                        logger.warning(f"无法处理文件 {filename} 中的改进意见。跳过。错误: {e}")
+                        suggestions_ok = False
+    
+    _log_stage_problems(filename, problems)
+    
+    # 双重验证：确保提取的列表长度与原始数据长度一致
+    if file_stages is not None and len(file_stages) != turn_count:
+        logger.error(f"文件 '{filename}' 处理后长度不匹配({len(file_stages)} vs {turn_count})，已跳过")
+        file_stages = None
+    
+    if not suggestions_ok:
+        return file_stages, None
+    return file_stages, (original_inner_lens, suggestions_data)
+
+
+def _extract_file_stages(file_path: str) -> Optional[List[Optional[str]]]:
+    """
+    从单个JSON文件中提取每个回合的"所处阶段"（可在子进程中执行）
+    
+    Args:
+        file_path: JSON文件路径
+        
+    Returns:
+        阶段列表（未找到阶段的回合为None）；文件无法处理时返回None
+    """
+    filename = os.path.basename(file_path)
+    try:
+        file_stages, _ = _scan_file(file_path, want_stages=True, want_suggestions=False)
+        return file_stages
+    except _JSON_DECODE_ERRORS:
+        logger.error(f"文件 '{filename}' 包含无效的JSON格式，已跳过")
+    except Exception as e:
+        logger.error(f"处理文件 '{filename}' 时发生未知错误: {e}")
+    return None
+
+
+def _extract_file_suggestions(source_file_path: str, output_file_path: str) -> Optional[bool]:
+    """
+    从单个JSON文件中提取"改进意见"并写入输出文件（可在子进程中执行）
+    
+    Args:
+        source_file_path: 源JSON文件路径
+        output_file_path: 输出JSON文件路径
+        
+    Returns:
+        结构验证是否通过；文件无法读取时返回None
+    """
+    filename = os.path.basename(source_file_path)
+    logger.info(f"正在处理文件: {filename}")
+    
+    try:
+        _, suggestions = _scan_file(source_file_path, want_stages=False, want_suggestions=True)
+    except _JSON_DECODE_ERRORS as e:
+        logger.warning(f"文件 {filename} 不是有效的JSON。跳过。错误: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"无法读取或处理文件 {filename}。跳过。错误: {e}")
+        return None
+    
+    if suggestions is None:
+        return None
+    return _save_file_suggestions(*suggestions, output_file_path)
+
+
+def _save_file_suggestions(original_inner_lens: List[int], suggestions_data: List[List[str]],
+                           output_file_path: str) -> bool:
+    """验证提取结果与原文件的结构一致并写入输出文件，返回验证是否通过"""
+    original_outer_len = len(original_inner_lens)
+    
+    # 验证步骤
+    new_outer_len = len(suggestions_data)
+    new_inner_lens = [len(sublist) for sublist in suggestions_data]
+    
+    # 长度列表与回合数成正比，只在确实输出调试日志时才格式化
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"- 原始结构: 外层列表长度 = {original_outer_len}, 内层列表长度 = {original_inner_lens}")
+        logger.debug(f"- 提取后结构: 外层列表长度 = {new_outer_len}, 内层列表长度 = {new_inner_lens}")
+    
+    validated = original_outer_len == new_outer_len and original_inner_lens == new_inner_lens
+    if validated:
+        logger.info("- 验证成功: 内外层列表的长度与原文件一致")
+    else:
+        logger.warning("- 验证失败: 提取后的结构与原文件不匹配。仍会保存文件")
+    
+    try:
+        _dump_json_file(suggestions_data, output_file_path)
+        logger.info(f"- 结果已保存至: {output_file_path}")
+    except Exception as e:
+        logger.error(f"- 错误: 无法写入文件 {output_file_path}。错误: {e}")
+    
+    return validated
+
+
+def _extract_file_data(source_file_path: str, output_file_path: str) -> Tuple[Optional[List[Optional[str]]], Optional[bool]]:
+    """
+    只解析一次JSON文件，同时提取"所处阶段"和"改进意见"（可在子进程中执行）
+    
+    Args:
+        source_file_path: 源JSON文件路径
+        output_file_path: 建议输出JSON文件路径
+        
+    Returns:
+        (阶段列表, 建议结构验证是否通过)；无法处理的部分为None
+    """
+    filename = os.path.basename(source_file_path)
+    logger.info(f"正在处理文件: {filename}")
+    
+    try:
+        file_stages, suggestions = _scan_file(source_file_path, want_stages=True, want_suggestions=True)
+    except _JSON_DECODE_ERRORS as e:
+        logger.error(f"文件 '{filename}' 包含无效的JSON格式，已跳过。错误: {e}")
+        return None, None
+    except Exception as e:
+        logger.error(f"处理文件 '{filename}' 时发生未知错误: {e}")
+        return None, None
+    
+    if suggestions is None:
+        return file_stages, None
+    return file_stages, _save_file_suggestions(*suggestions, output_file_path)
+
+
 class StageExtractor:
     """用于从JSON文件中提取对话的"所处阶段"信息的工具类"""
     
-    def __init__(self):
-        # 定义一个极其宽松的正则表达式，仅用于定位"所处阶段"并捕获其后的所有内容
-        self.stage_finder = re.compile(r'所处阶段(.*)')
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: 并行处理文件的最大进程数，默认为None（在当前进程中依次处理）。
+                启用后子进程会重新导入本包（spawn/forkserver启动方式下），调用脚本必须把
+                入口代码放在 if __name__ == "__main__": 之下；子进程中的日志不会经过父进程的处理器
+        """
+        # 一次匹配完成定位和清洗
+        self.stage_finder = _STAGE_RE
+        self.max_workers = max_workers
         
     def extract_stages_from_directory(self, directory_path: str) -> Tuple[Optional[Dict[str, List[Optional[str]]]], Optional[List[str]]]:
         """
@@ -39,64 +467,17 @@ class StageExtractor:
             logger.error(f"目录 '{directory_path}' 不存在")
             return None, None
         
-        files_to_process = sorted([f for f in os.listdir(directory_path) if f.endswith('.json')])
+        files_to_process, paths = _scan_json_files(directory_path)
         logger.info(f"在 '{directory_path}' 目录中找到 {len(files_to_process)} 个JSON文件")
         
-        for filename in files_to_process:
-            file_path = os.path.join(directory_path, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                if not isinstance(data, list):
-                    logger.warning(f"文件 '{filename}' 的顶层内容不是列表，已跳过")
-                    error_files.append(filename)
-                    continue
-                
-                file_stages = []
-                # 遍历文件中的每一个内部列表（代表一个对话回合）
-                for i, turn_list in enumerate(data):
-                    stage = None  # 默认值为None，确保即使提取失败也占位
-                    
-                    if isinstance(turn_list, list) and turn_list:
-                        last_item_str = turn_list[0]
-                        
-                        if isinstance(last_item_str, str):
-                            match = self.stage_finder.search(last_item_str)
-                            if match:
-                                # 第一步：获取"所处阶段"之后的所有原始文本
-                                raw_content = match.group(1)
-                                
-                                # 第二步：清洗前后多余的符号，提取核心内容
-                                # 清除开头的非字母数字字符（如 '":"' 或 '\\":\\"'）
-                                cleaned_content = re.sub(r'^[":\s\\]+', '', raw_content)
-                                # 清除结尾的非字母数字字符（如 '"}' 或 '\\"}'）
-                                cleaned_content = re.sub(r'["\\}\s]*$', '', cleaned_content)
-                                
-                                stage = cleaned_content.strip()
-                            else:
-                                logger.warning(f"文件 '{filename}', 回合 {i+1}, 未找到 '所处阶段'")
-                        else:
-                            logger.warning(f"文件 '{filename}', 回合 {i+1}, 末尾项不是字符串")
-                    else:
-                        logger.warning(f"文件 '{filename}', 回合 {i+1}, 内容为空或格式不正确")
-                    
-                    file_stages.append(stage)
-                
-                # 双重验证：确保提取的列表长度与原始数据长度一致
-                if len(file_stages) != len(data):
-                    logger.error(f"文件 '{filename}' 处理后长度不匹配({len(file_stages)} vs {len(data)})，已跳过")
-                    error_files.append(filename)
-                    continue
-                
-                all_stages_data[filename] = file_stages
-                
-            except json.JSONDecodeError:
-                logger.error(f"文件 '{filename}' 包含无效的JSON格式，已跳过")
-                error_files.append(filename)
-            except Exception as e:
-                logger.error(f"处理文件 '{filename}' 时发生未知错误: {e}")
+        # 各文件相互独立，文件较多时并行处理
+        results = _map_files(_extract_file_stages, self.max_workers, paths)
+        
+        for filename, file_stages in zip(files_to_process, results):
+            if file_stages is None:
                 error_files.append(filename)
+            else:
+                all_stages_data[filename] = file_stages
         
         return all_stages_data, error_files
     
@@ -112,29 +493,37 @@ class StageExtractor:
         """
         # 保存到JSON文件
         logger.info(f"正在将结果保存到 '{output_json_file}'...")
-        with open(output_json_file, 'w', encoding='utf-8') as f:
-            json.dump(extracted_data, f, ensure_ascii=False, indent=4)
+        _dump_json_file(extracted_data, output_json_file)
         
-        # 保存到纯文本文件以便查看
+        # 保存到纯文本文件以便查看；先拼好全部内容再一次写入
         logger.info(f"正在将纯文本结果保存到 '{output_txt_file}'...")
+        parts = []
+        for filename, stages in extracted_data.items():
+            parts.append(f"--- {filename} ---\n")
+            if stages:
+                # 将None转换为特定标记以便打印
+                parts.append("\n".join(s if s is not None else "[阶段未找到]" for s in stages))
+            else:
+                parts.append("未提取到任何阶段。")
+            parts.append("\n\n")
+        
         with open(output_txt_file, 'w', encoding='utf-8') as f:
-            for filename, stages in extracted_data.items():
-                f.write(f"--- {filename} ---\n")
-                if stages:
-                    # 将None转换为特定标记以便打印
-                    printable_stages = [s if s is not None else "[阶段未找到]" for s in stages]
-                    f.write("\n".join(printable_stages))
-                else:
-                    f.write("未提取到任何阶段。")
-                f.write("\n\n")
+            f.write("".join(parts))
 
 
 class SuggestionExtractor:
     """用于从JSON文件中提取"改进意见"的工具类"""
     
-    def __init__(self):
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: 并行处理文件的最大进程数，默认为None（在当前进程中依次处理）。
+                启用后子进程会重新导入本包（spawn/forkserver启动方式下），调用脚本必须把
+                入口代码放在 if __name__ == "__main__": 之下；子进程中的日志不会经过父进程的处理器
+        """
         # 用于找到"改进意见"键值的正则表达式
-        self.suggestion_pattern = re.compile(r'"改进意见":"((?:[^"\\]|\\.)*)"')
+        self.suggestion_pattern = _SUGGESTION_RE
+        self.max_workers = max_workers
     
     def extract_suggestions_structured(self, source_folder: str, output_folder: str) -> List[str]:
         """
@@ -155,68 +544,16 @@ class SuggestionExtractor:
             os.makedirs(output_folder)
             logger.info(f"已创建输出文件夹: '{output_folder}'")
         
-        failed_validation_files = []
-        
         logger.info(f"正在扫描 '{source_folder}' 中的文件...")
-        for filename in os.listdir(source_folder):
-            if not filename.endswith('.json'):
-                continue
-            
-            source_file_path = os.path.join(source_folder, filename)
-            output_file_path = os.path.join(output_folder, filename)
-            
-            logger.info(f"正在处理文件: {filename}")
-            
-            try:
-                with open(source_file_path, 'r', encoding='utf-8') as f:
-                    original_data = json.load(f)
-            except json.JSONDecodeError as e:
-                logger.warning(f"文件 {filename} 不是有效的JSON。跳过。错误: {e}")
-                continue
-            except Exception as e:
-                logger.warning(f"无法读取或处理文件 {filename}。跳过。错误: {e}")
-                continue
-            
-            original_outer_len = len(original_data)
-            original_inner_lens = [len(sublist) for sublist in original_data]
-            
-            suggestions_data = []
-            
-            for original_inner_list in original_data:
-                new_inner_list = []
-                for item_string in original_inner_list:
-                    # 在当前项字符串中查找所有建议
-                    matches = self.suggestion_pattern.findall(item_string)
-                    
-                    if matches:
-                        # 如果字符串格式不正确，可能有多个匹配
-                        # 我们将它们连接以保留所有信息
-                        new_inner_list.append(" | ".join(matches))
-                    else:
-                        # 如果没有找到建议，添加占位符以保持长度一致
-                        new_inner_list.append("未找到改进意见")
-                
-                suggestions_data.append(new_inner_list)
-            
-            # 验证步骤
-            new_outer_len = len(suggestions_data)
-            new_inner_lens = [len(sublist) for sublist in suggestions_data]
-            
-            logger.debug(f"- 原始结构: 外层列表长度 = {original_outer_len}, 内层列表长度 = {original_inner_lens}")
-            logger.debug(f"- 提取后结构: 外层列表长度 = {new_outer_len}, 内层列表长度 = {new_inner_lens}")
-            
-            if original_outer_len == new_outer_len and original_inner_lens == new_inner_lens:
-                logger.info("- 验证成功: 内外层列表的长度与原文件一致")
-            else:
-                logger.warning("- 验证失败: 提取后的结构与原文件不匹配。仍会保存文件")
-                failed_validation_files.append(filename)
-            
-            try:
-                with open(output_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(suggestions_data, f, ensure_ascii=False, indent=4)
-                logger.info(f"- 结果已保存至: {output_file_path}")
-            except Exception as e:
-                logger.error(f"- 错误: 无法写入文件 {output_file_path}。错误: {e}")
+        filenames, source_paths = _scan_json_files(source_folder)
+        
+        # 各文件相互独立，文件较多时并行处理；输出目录前缀（含末尾分隔符）只拼接一次
+        output_prefix = os.path.join(output_folder, "")
+        output_paths = [f"{output_prefix}{filename}" for filename in filenames]
+        results = _map_files(_extract_file_suggestions, self.max_workers, source_paths, output_paths)
+        
+        # None表示文件无法读取而被跳过，不计入验证失败
+        failed_validation_files = [filename for filename, validated in zip(filenames, results) if validated is False]
         
         if failed_validation_files:
             logger.warning(f"以下 {len(failed_validation_files)} 个文件未能通过结构验证:")
@@ -231,9 +568,13 @@ class SuggestionExtractor:
 class DataExtractor:
     """数据提取工具的主类，整合阶段和建议提取功能"""
     
-    def __init__(self):
-        self.stage_extractor = StageExtractor()
-        self.suggestion_extractor = SuggestionExtractor()
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: 并行处理文件的最大进程数，默认在当前进程中依次处理（见StageExtractor）
+        """
+        self.stage_extractor = StageExtractor(max_workers)
+        self.suggestion_extractor = SuggestionExtractor(max_workers)
     
     def extract_stages_from_directory(self, directory_path: str, 
                                     output_json_file: str = 'extracted_stages.json',
@@ -307,26 +648,53 @@ class DataExtractor:
             'suggestions': {'success': 0, 'failed_validation': []}
         }
         
-        # 提取阶段信息
-        stages_data, stage_errors = self.extract_stages_from_directory(
-            base_directory,
+        if not os.path.isdir(base_directory):
+            logger.error(f"目录 '{base_directory}' 不存在")
+            return results
+        
+        if not os.path.exists(suggestions_output_folder):
+            os.makedirs(suggestions_output_folder)
+            logger.info(f"已创建输出文件夹: '{suggestions_output_folder}'")
+        
+        # 目录只扫描一次，每个文件只解析一次，同时提取阶段和建议
+        filenames, source_paths = _scan_json_files(base_directory)
+        logger.info(f"在 '{base_directory}' 目录中找到 {len(filenames)} 个JSON文件")
+        
+        output_prefix = os.path.join(suggestions_output_folder, "")
+        output_paths = [f"{output_prefix}{filename}" for filename in filenames]
+        file_results = _map_files(_extract_file_data, self.stage_extractor.max_workers, source_paths, output_paths)
+        
+        stages_data = {}
+        stage_errors = []
+        failed_validations = []
+        for filename, (file_stages, validated) in zip(filenames, file_results):
+            if file_stages is None:
+                stage_errors.append(filename)
+            else:
+                stages_data[filename] = file_stages
+            # None表示文件无法读取而被跳过，不计入验证失败
+            if validated is False:
+                failed_validations.append(filename)
+        
+        logger.info(f"阶段提取完成。成功处理 {len(stages_data)} 个文件")
+        if stage_errors:
+            logger.warning(f"处理过程中有 {len(stage_errors)} 个文件遇到问题")
+        self.stage_extractor.save_extracted_stages(
+            stages_data,
             f'{stages_output_prefix}.json',
             f'{stages_output_prefix}.txt'
         )
         
-        if stages_data:
-            results['stages']['success'] = len(stages_data)
-            results['stages']['errors'] = stage_errors or []
-        
-        # 提取建议信息
-        failed_validations = self.extract_suggestions_from_directory(
-            base_directory,
-            suggestions_output_folder
-        )
+        if failed_validations:
+            logger.warning(f"有 {len(failed_validations)} 个文件验证失败")
+            for f_name in failed_validations:
+                logger.warning(f"  - {f_name}")
+        else:
+            logger.info("所有文件均已成功处理")
         
-        # 计算成功处理的文件数
-        json_files = [f for f in os.listdir(base_directory) if f.endswith('.json')]
-        results['suggestions']['success'] = len(json_files) - len(failed_validations)
+        results['stages']['success'] = len(stages_data)
+        results['stages']['errors'] = stage_errors
+        results['suggestions']['success'] = len(filenames) - len(failed_validations)
         results['suggestions']['failed_validation'] = failed_validations
         
         return results
@@ -4,12 +4,23 @@ Rewrites formal sentences to natural, conversational language.
 """
 
 import logging
-from typing import Optional, List, Dict, Any
+import string
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
 from ..llm_client import get_llm_client
 from ..config import config
 
 logger = logging.getLogger(__name__)
 
+# 高于该温度的改写被视为有意追求多样性，不做缓存
+_CACHE_MAX_TEMPERATURE = 0.9
+
+# 改写请求的系统消息，所有请求共用同一个对象（只读，LLM客户端不会修改消息）
+_REWRITE_SYSTEM_MESSAGE = {"role": "system", "content": "你是一位专业的语言专家，擅长改写句子。"}
+
 
 class SentenceRewriter:
     """使用大语言模型改写句子的工具类"""
@@ -24,6 +35,11 @@ class SentenceRewriter:
         self.llm_client = get_llm_client()
         self.model_name = model_name or config.model.CONVERSATION_MODEL
         
+        # 相同(句子, 上下文, 温度)的改写结果缓存，按最近使用顺序淘汰；批量改写时会被多个线程访问
+        self._cache: "OrderedDict[Tuple[str, str, float], str]" = OrderedDict()
+        self._cache_size = config.system.REWRITE_CACHE_SIZE
+        self._cache_lock = threading.Lock()
+        
         # 改写句子的提示词模板
         self.rewrite_prompt = """
 你是一位语言专家，专门将正式、生硬的表达改写成自然、符合人类说话习惯的句子。
@@ -60,6 +76,38 @@ class SentenceRewriter:
 - 只返回改写后的句子，不要其他解释
 """
     
+    @property
+    def rewrite_prompt(self) -> str:
+        """改写句子的提示词模板，包含{context}和{sentence}两个占位符"""
+        return self._rewrite_prompt
+    
+    @rewrite_prompt.setter
+    def rewrite_prompt(self, template: str):
+        self._rewrite_prompt = template
+        # 预先解析模板（占位符可任意顺序、重复出现，{{ }}转义照常还原），每次改写只需拼接；
+        # 含其他字段、格式说明或格式错误的模板仍交给str.format，行为与直接format一致
+        pieces: Optional[List[Tuple[str, Optional[str]]]] = []
+        try:
+            for literal, field, format_spec, conversion in string.Formatter().parse(template):
+                if field is not None and (field not in ("context", "sentence") or format_spec or conversion):
+                    pieces = None
+                    break
+                pieces.append((literal, field))
+        except ValueError:
+            pieces = None
+        self._prompt_pieces = pieces
+    
+    def _build_prompt(self, context: str, sentence: str) -> str:
+        """用上下文和句子填充改写提示词模板"""
+        if self._prompt_pieces is None:
+            return self._rewrite_prompt.format(context=context, sentence=sentence)
+        
+        values = {"context": context, "sentence": sentence}
+        return "".join(
+            literal if field is None else literal + values[field]
+            for literal, field in self._prompt_pieces
+        )
+    
     def rewrite_sentence(self, sentence: str, temperature: float = 0.7) -> str:
         """
         改写单个句子（无上下文）
@@ -85,14 +133,20 @@ class SentenceRewriter:
         Returns:
             改写后的句子
         """
+        cache_key = None
+        if self._cache_size > 0 and temperature <= _CACHE_MAX_TEMPERATURE:
+            cache_key = (sentence, context, round(temperature, 2))
+            with self._cache_lock:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    self._cache.move_to_end(cache_key)
+                    return cached
+        
         try:
             # 构建完整的提示词
-            prompt = self.rewrite_prompt.format(context=context, sentence=sentence)
+            prompt = self._build_prompt(context, sentence)
             
-            messages = [
-                {"role": "system", "content": "你是一位专业的语言专家，擅长改写句子。"},
-                {"role": "user", "content": prompt}
-            ]
+            messages = [_REWRITE_SYSTEM_MESSAGE, {"role": "user", "content": prompt}]
             
             # 使用统一的LLM客户端
             rewritten = self.llm_client.generate_conversation_response(
@@ -101,11 +155,21 @@ class SentenceRewriter:
             )
             
             logger.debug(f"句子改写成功: {sentence[:30]}... -> {rewritten[:30]}...")
-            return rewritten.strip()
+            rewritten = rewritten.strip()
             
         except Exception as e:
             logger.error(f"带上下文改写失败: {str(e)}")
             return sentence
+        
+        # 只缓存成功的改写，失败时下次仍会重新请求
+        if cache_key is not None:
+            with self._cache_lock:
+                self._cache[cache_key] = rewritten
+                self._cache.move_to_end(cache_key)
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        
+        return rewritten
 
     def rewrite_multiple_sentences(self, sentences: List[str], temperature: float = 0.7) -> List[Dict[str, str]]:
         """
@@ -125,33 +189,43 @@ class SentenceRewriter:
         
         return self.rewrite_multiple_with_context(sentences_with_context, temperature)
 
-    def rewrite_multiple_with_context(self, sentences_with_context: List[Dict[str, str]], temperature: float = 0.7) -> List[Dict[str, str]]:
+    def rewrite_multiple_with_context(self, sentences_with_context: List[Dict[str, str]], temperature: float = 0.7,
+                                      max_workers: Optional[int] = None) -> List[Dict[str, str]]:
         """
         批量改写多个带上下文的句子
         
+        各句子的请求并发发出，总耗时约为最慢的一次请求而不是所有请求之和。
+        
         Args:
             sentences_with_context: 包含句子和上下文的列表，格式: [{"sentence": "句子", "context": "上下文"}, ...]
             temperature: 生成的随机性
+            max_workers: 最大并发请求数，默认为config.model.MAX_CONCURRENT_REQUESTS。
+                后端请求并发仍由LLM客户端的共享请求队列统一限制
             
         Returns:
-            改写后的句子列表
+            改写后的句子列表（顺序与输入一致）
         """
-        rewritten_sentences = []
+        total = len(sentences_with_context)
         
-        for i, item in enumerate(sentences_with_context):
-            logger.info(f"正在改写第 {i+1}/{len(sentences_with_context)} 句...")
+        def rewrite_item(index: int, item: Dict[str, str]) -> Dict[str, str]:
+            logger.info(f"正在改写第 {index+1}/{total} 句...")
             
             sentence = item.get('sentence', '')
             context = item.get('context', '')
             
             rewritten = self.rewrite_with_context(sentence, context, temperature)
-            rewritten_sentences.append({
+            return {
                 'original': sentence,
                 'context': context,
                 'rewritten': rewritten
-            })
+            }
         
-        return rewritten_sentences
+        if total <= 1:
+            return [rewrite_item(i, item) for i, item in enumerate(sentences_with_context)]
+        
+        workers = min(max_workers or config.model.MAX_CONCURRENT_REQUESTS, total)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(rewrite_item, range(total), sentences_with_context))
     
     def rewrite_cbt_stage_sentences(self, sentences: List[str], stage: str, temperature: float = 0.7) -> List[Dict[str, str]]:
         """
@@ -249,12 +323,22 @@ class CounselorResponseEnhancer:
         return enhanced_responses
 
 
+# 便捷函数共用的实例，第一次使用时创建；改写结果缓存也因此在多次调用之间共享
+@lru_cache(maxsize=None)
+def _default_rewriter() -> SentenceRewriter:
+    return SentenceRewriter()
+
+
+@lru_cache(maxsize=None)
+def _default_enhancer() -> CounselorResponseEnhancer:
+    return CounselorResponseEnhancer()
+
+
 # 便捷函数
 def quick_rewrite(sentence: str, context: str = "心理咨询对话场景") -> str:
     """快速改写单个句子的便捷函数"""
     try:
-        rewriter = SentenceRewriter()
-        return rewriter.rewrite_with_context(sentence, context)
+        return _default_rewriter().rewrite_with_context(sentence, context)
     except Exception as e:
         logger.error(f"快速改写失败: {e}")
         return sentence
@@ -263,8 +347,7 @@ def quick_rewrite(sentence: str, context: str = "心理咨询对话场景") -> s
 def quick_enhance_counselor_response(response: str, stage: str = "对话") -> str:
     """快速增强咨询师回复的便捷函数"""
     try:
-        enhancer = CounselorResponseEnhancer()
-        return enhancer.enhance_response(response, {"current_stage": stage})
+        return _default_enhancer().enhance_response(response, {"current_stage": stage})
     except Exception as e:
         logger.error(f"快速增强失败: {e}")
         return response
@@ -287,12 +370,10 @@ def integrate_with_counselor_agent(original_response: str,
     Returns:
         增强后的回复
     """
-    enhancer = CounselorResponseEnhancer()
-    
     dialogue_context = {
         'current_stage': current_stage,
         'patient_emotion': patient_emotion,
         'session_type': session_type
     }
     
-    return enhancer.enhance_response(original_response, dialogue_context) 
\ No newline at end of file
+    return _default_enhancer().enhance_response(original_response, dialogue_context) 
\ No newline at end of file